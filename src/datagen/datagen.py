@@ -288,6 +288,93 @@ class SyntheticDataGenerator:
         self.revenue_df = pd.DataFrame(data)
         return self.revenue_df
 
+    def generate_revenue_timeseries(
+        self,
+        start_date=None,
+        end_date=None,
+        transactions_per_day=100,
+        trend_per_year=None,
+        weekly_amplitude=0.15,
+        yearly_amplitude=0.25,
+        noise=0.2,
+    ):
+        """
+        Generate synthetic revenue transactions, vectorised with NumPy.
+
+        The number of transactions per day is Poisson distributed around
+        transactions_per_day, scaled by weekly and yearly seasonality. Each
+        transaction's revenue is a per-product base price with a per-product
+        linear trend, the same seasonality and multiplicative log-normal noise.
+
+        Args:
+            start_date (datetime, optional): Start date for the revenue data
+            end_date (datetime, optional): End date for the revenue data
+            transactions_per_day (float): Average number of transactions per day
+            trend_per_year (dict, optional): Yearly relative growth per product,
+                random between -5% and +15% when not given
+            weekly_amplitude (float): Relative amplitude of the weekly cycle
+            yearly_amplitude (float): Relative amplitude of the yearly cycle
+            noise (float): Standard deviation of the log-normal revenue noise
+
+        Returns:
+            pandas.DataFrame: DataFrame containing revenue data, with ``date``
+                and ``timestamp`` as datetime64 columns
+        """
+        if start_date is None:
+            start_date = datetime(2024, 1, 1)
+        if end_date is None:
+            end_date = datetime(2025, 1, 1)
+
+        rng = np.random.default_rng(self.seed)
+        products = np.asarray(self.products, dtype=object)
+        categories = np.asarray(self.categories, dtype=object)
+
+        if trend_per_year is None:
+            trend = rng.uniform(-0.05, 0.15, len(products))
+        else:
+            trend = np.asarray([trend_per_year.get(p, 0.0) for p in products])
+        base_price = rng.uniform(200, 700, len(products))
+
+        days = pd.date_range(start_date, end_date, freq="D", normalize=True)
+        day_of_week = days.dayofweek.to_numpy()
+        day_of_year = days.dayofyear.to_numpy()
+        seasonality = (
+            1
+            + weekly_amplitude * np.cos(2 * np.pi * (day_of_week - 2) / 7)
+            + yearly_amplitude * np.cos(2 * np.pi * (day_of_year - 172) / 365.25)
+        )
+        counts = rng.poisson(transactions_per_day * np.clip(seasonality, 0, None))
+
+        day_idx = np.repeat(np.arange(len(days)), counts)
+        n = len(day_idx)
+        product_idx = rng.integers(0, len(products), n)
+        category_idx = rng.integers(0, len(categories), n)
+
+        years = (days - days[0]).days.to_numpy()[day_idx] / 365.25
+        revenue = (
+            base_price[product_idx]
+            * (1 + trend[product_idx] * years)
+            * seasonality[day_idx]
+            * rng.lognormal(0.0, noise, n)
+        )
+
+        # Seconds since the first day; sorting keeps every second in its own
+        # day (offsets are below 86400) and makes the timestamps increasing
+        seconds = np.sort(day_idx * 86400 + rng.integers(0, 86400, n))
+        timestamp = days[0].to_datetime64() + seconds.astype("timedelta64[s]")
+        date = days.to_numpy()[day_idx]
+
+        self.revenue_df = pd.DataFrame(
+            {
+                "date": date,
+                "timestamp": timestamp,
+                "product": products[product_idx],
+                "category": categories[category_idx],
+                "revenue": np.round(np.maximum(revenue, 0.01), 2),
+            }
+        )
+        return self.revenue_df
+
     def save_to_parquet(self, output_dir="data"):
         """
         Save all generated data to parquet files.
@@ -407,6 +494,7 @@ class SyntheticDataGenerator:
         generate_revenue=True,
         revenue_start_date=None,
         revenue_end_date=None,
+        revenue_transactions_per_day=None,
     ):
         """
         Generate all types of data at once.
@@ -417,6 +505,9 @@ class SyntheticDataGenerator:
             generate_revenue (bool): Whether to generate revenue data
             revenue_start_date (datetime, optional): Start date for revenue data
             revenue_end_date (datetime, optional): End date for revenue data
+            revenue_transactions_per_day (float, optional): When set, generate
+                revenue with generate_revenue_timeseries at this average daily
+                volume instead of one transaction per day
 
         Returns:
             tuple: (customer_df, policy_df, analytics_df, revenue_df)
@@ -427,7 +518,13 @@ class SyntheticDataGenerator:
             num_sessions_per_customer=num_sessions_per_customer
         )
 
-        if generate_revenue:
+        if generate_revenue and revenue_transactions_per_day is not None:
+            self.generate_revenue_timeseries(
+                start_date=revenue_start_date,
+                end_date=revenue_end_date,
+                transactions_per_day=revenue_transactions_per_day,
+            )
+        elif generate_revenue:
             self.generate_revenue_data(
                 start_date=revenue_start_date, end_date=revenue_end_date
             )
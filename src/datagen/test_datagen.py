@@ -0,0 +1,49 @@
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from datagen import SyntheticDataGenerator
+
+
+def test_generate_revenue_timeseries_years_of_data_in_seconds():
+    generator = SyntheticDataGenerator(seed=7)
+
+    started = time.perf_counter()
+    df = generator.generate_revenue_timeseries(
+        start_date=datetime(2022, 1, 1),
+        end_date=datetime(2024, 12, 31),
+        transactions_per_day=5000,
+    )
+    elapsed = time.perf_counter() - started
+
+    num_days = 3 * 365 + 1
+    assert abs(len(df) - num_days * 5000) < 0.02 * num_days * 5000
+    assert elapsed < 10, f"took {elapsed:.1f}s for {len(df)} rows"
+
+    assert pd.api.types.is_datetime64_dtype(df["date"])
+    assert pd.api.types.is_datetime64_dtype(df["timestamp"])
+    assert df["date"].min() == pd.Timestamp("2022-01-01")
+    assert df["date"].max() == pd.Timestamp("2024-12-31")
+
+    timestamps = df["timestamp"].to_numpy()
+    assert (np.diff(timestamps) >= np.timedelta64(0, "s")).all()
+    assert (df["timestamp"].dt.normalize() == df["date"]).all()
+
+    assert set(df["product"].unique()) == set(generator.products)
+    assert set(df["category"].unique()) == set(generator.categories)
+    assert (df["revenue"] > 0).all()
+
+
+def test_generate_revenue_timeseries_is_reproducible():
+    kwargs = dict(
+        start_date=datetime(2024, 1, 1),
+        end_date=datetime(2024, 3, 31),
+        transactions_per_day=50,
+    )
+
+    first = SyntheticDataGenerator(seed=1).generate_revenue_timeseries(**kwargs)
+    second = SyntheticDataGenerator(seed=1).generate_revenue_timeseries(**kwargs)
+
+    pd.testing.assert_frame_equal(first, second)
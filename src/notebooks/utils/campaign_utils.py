@@ -0,0 +1,361 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import google.auth
+import google.auth.transport.requests
+import requests
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+TEXT_MODEL = "gemini-1.5-pro-001"
+IMAGE_MODEL = "imagen-3.0-generate-001"
+
+# Requests per minute, per model
+DEFAULT_RATE_LIMITS = {TEXT_MODEL: 60, IMAGE_MODEL: 20}
+
+RETRY_ERRORS = ["RESOURCE_EXHAUSTED", "No content in candidate", "Status: 429"]
+
+
+def encode_image_base64(image):
+    """
+    Base64-encode an image as is, without decoding and re-encoding the pixels.
+
+    Args:
+        image (str or bytes): Path of a PNG file, or its bytes
+
+    Returns:
+        str: Base64 string of the file contents
+    """
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            image = f.read()
+    return base64.b64encode(image).decode("utf-8")
+
+
+def _is_retryable(error):
+    return any(retry_error in str(error) for retry_error in RETRY_ERRORS)
+
+
+class AssetCache:
+    """
+    Content-addressed store for generated text and images.
+
+    The key of an asset is the SHA-256 of the model, the prompt and the call
+    parameters, so the same request is only ever generated once. Files are
+    written to a temporary name and renamed, so readers never see partial assets.
+    """
+
+    def __init__(self, directory="campaign_assets_cache"):
+        self.directory = directory
+
+    @staticmethod
+    def key(kind, model, prompt, **params):
+        payload = json.dumps(
+            {"kind": kind, "model": model, "prompt": prompt, "params": params},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, key[:2], f"{key}.{extension}")
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    def get_text(self, key):
+        path = self.path(key, "txt")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def put_text(self, key, text):
+        self._write(self.path(key, "txt"), text.encode("utf-8"))
+        return text
+
+    def get_image(self, key):
+        """Returns the path of a cached image, or None."""
+        path = self.path(key, "png")
+        return path if os.path.exists(path) else None
+
+    def put_image(self, key, image_bytes):
+        return self._write(self.path(key, "png"), image_bytes)
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing ``rate_per_minute`` calls per minute."""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute
+        self.capacity = max(1.0, rate_per_minute / 60.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) / self.interval
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_seconds = (1 - self.tokens) * self.interval
+            time.sleep(wait_seconds)
+
+
+class VertexAIBackend:
+    """
+    Gemini and Imagen over the Vertex AI REST API.
+
+    Credentials are refreshed only when they are about to expire, and one HTTP
+    session is shared by all calls, instead of a refresh per request. Calls are
+    not retried here; CampaignEngine retries them behind its rate limiters.
+    """
+
+    def __init__(self, project_id, location):
+        self.project_id = project_id
+        self.location = location
+        self.session = requests.Session()
+        self._credentials, _ = google.auth.default()
+        self._lock = threading.Lock()
+
+    def _headers(self):
+        with self._lock:
+            if not self._credentials.valid:
+                self._credentials.refresh(google.auth.transport.requests.Request())
+            token = self._credentials.token
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
+
+    def _url(self, model, method):
+        return (
+            f"https://{self.location}-aiplatform.googleapis.com/v1/projects/"
+            f"{self.project_id}/locations/{self.location}/publishers/google/models/"
+            f"{model}:{method}"
+        )
+
+    def _post(self, url, payload):
+        response = self.session.post(url, json=payload, headers=self._headers())
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Vertex AI request failed -> Status: {response.status_code} "
+                f"Text: {response.text}"
+            )
+        return response.json()
+
+    def _generate_content(self, model, parts, response_schema, temperature):
+        generation_config = {
+            "temperature": temperature,
+            "topP": 1,
+            "maxOutputTokens": 8192,
+            "candidateCount": 1,
+            "responseMimeType": "application/json",
+        }
+        if response_schema is not None:
+            generation_config["responseSchema"] = response_schema
+        payload = {
+            "contents": {"role": "user", "parts": parts},
+            "generation_config": generation_config,
+            "safety_settings": {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_LOW_AND_ABOVE",
+            },
+        }
+        json_response = self._post(self._url(model, "generateContent"), payload)
+        try:
+            text = json_response["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError):
+            raise RuntimeError(f"No content in candidate: {json_response}")
+        # Remove some typically response characters (if asking for a JSON reply)
+        return text.replace("```json", "").replace("```", "").replace("\n", "")
+
+    def generate_text(self, model, prompt, response_schema=None, temperature=1):
+        return self._generate_content(
+            model, [{"text": prompt}], response_schema, temperature
+        )
+
+    def verify_image(self, model, prompt, image_base64, response_schema=None, temperature=1):
+        parts = [
+            {"text": prompt},
+            {"inlineData": {"mimeType": "image/png", "data": image_base64}},
+        ]
+        return self._generate_content(model, parts, response_schema, temperature)
+
+    def generate_image(self, model, prompt, person_generation="dont_allow"):
+        payload = {
+            "instances": [{"prompt": prompt}],
+            "parameters": {"sampleCount": 1, "personGeneration": person_generation},
+        }
+        json_response = self._post(self._url(model, "predict"), payload)
+        if "predictions" not in json_response:
+            raise RuntimeError(f"No predictions in response: {json_response}")
+        return base64.b64decode(json_response["predictions"][0]["bytesBase64Encoded"])
+
+
+class CampaignEngine:
+    """
+    Generates campaign assets for many customers at once.
+
+    Customers are processed by a bounded thread pool and every model call goes
+    through that model's rate limiter, retries of quota errors included.
+    Identical requests are deduplicated:
+    results come from the AssetCache when present, and concurrent requests for
+    the same key wait for the single call in flight.
+
+    Any object with ``generate_text``, ``generate_image`` and ``verify_image``
+    (same signatures as VertexAIBackend) can be used as backend, e.g. a fake
+    one for offline runs.
+    """
+
+    def __init__(self, backend, cache=None, max_workers=8, rate_limits=None):
+        """
+        Args:
+            backend: Model backend, e.g. VertexAIBackend
+            cache (AssetCache, optional): Asset cache, defaults to a local one
+            max_workers (int): Number of customers processed concurrently
+            rate_limits (dict, optional): Model -> requests per minute
+        """
+        self.backend = backend
+        self.cache = cache if cache is not None else AssetCache()
+        self.max_workers = max_workers
+        self.rate_limiters = {
+            model: RateLimiter(rate)
+            for model, rate in (rate_limits or DEFAULT_RATE_LIMITS).items()
+        }
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _once(self, key, cached, produce):
+        value = cached(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            # A previous owner may have stored the value after our first lookup
+            value = cached(key)
+            if value is None:
+                value = produce()
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    @retry(
+        wait=wait_exponential(multiplier=1, min=1, max=60),
+        stop=stop_after_attempt(10),
+        retry=retry_if_exception(_is_retryable),
+        before_sleep=before_sleep_log(logging.getLogger(), logging.INFO),
+    )
+    def _limited(self, model, fn, *args, **kwargs):
+        # Retried as a whole, so every attempt (e.g. after a 429) takes a token
+        limiter = self.rate_limiters.get(model)
+        if limiter is not None:
+            limiter.acquire()
+        return fn(model, *args, **kwargs)
+
+    def generate_text(self, prompt, model=TEXT_MODEL, response_schema=None):
+        """Returns the (cached) text response for a prompt."""
+        key = self.cache.key("text", model, prompt, response_schema=response_schema)
+        return self._once(
+            key,
+            self.cache.get_text,
+            lambda: self.cache.put_text(
+                key,
+                self._limited(
+                    model, self.backend.generate_text, prompt, response_schema=response_schema
+                ),
+            ),
+        )
+
+    def generate_image(self, prompt, model=IMAGE_MODEL):
+        """Returns the path of the (cached) PNG generated for a prompt."""
+        key = self.cache.key("image", model, prompt)
+        return self._once(
+            key,
+            self.cache.get_image,
+            lambda: self.cache.put_image(
+                key, self._limited(model, self.backend.generate_image, prompt)
+            ),
+        )
+
+    def verify_image(self, prompt, image_path, model=TEXT_MODEL, response_schema=None):
+        """Returns the (cached) verification response for an image."""
+        image_base64 = encode_image_base64(image_path)
+        key = self.cache.key(
+            "verify",
+            model,
+            prompt,
+            image=hashlib.sha256(image_base64.encode("utf-8")).hexdigest(),
+            response_schema=response_schema,
+        )
+        return self._once(
+            key,
+            self.cache.get_text,
+            lambda: self.cache.put_text(
+                key,
+                self._limited(
+                    model,
+                    self.backend.verify_image,
+                    prompt,
+                    image_base64,
+                    response_schema=response_schema,
+                ),
+            ),
+        )
+
+    def run(self, customers, process):
+        """
+        Run ``process(engine, customer)`` for every customer concurrently.
+
+        Args:
+            customers (list): Customer dicts
+            process (callable): Generates the assets of one customer using the
+                engine's generate_* methods and returns a dict
+
+        Returns:
+            list: One result per customer, in input order. A failed customer
+                gets ``{"customer_id": ..., "error": ...}`` instead
+        """
+
+        def safe_process(customer):
+            try:
+                return process(self, customer)
+            except Exception as e:
+                print(f"Campaign [Error] for Customer {customer.get('customer_id')}: {e}")
+                return {"customer_id": customer.get("customer_id"), "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(safe_process, customers))
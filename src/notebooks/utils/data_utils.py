@@ -0,0 +1,187 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+
+# Where src/datagen/datagen.py writes its parquet files (save_to_parquet)
+DATA_DIR = os.environ.get(
+    "DATA_DIR",
+    os.path.normpath(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "datagen", "data")
+    ),
+)
+
+WAREHOUSE_MODES = ("never", "fallback", "always")
+DTYPE_BACKENDS = ("pyarrow", "numpy")
+
+_SQL_OPERATORS = {
+    "=": "=",
+    "==": "=",
+    "!=": "!=",
+    "<": "<",
+    "<=": "<=",
+    ">": ">",
+    ">=": ">=",
+    "in": "IN UNNEST",
+    "not in": "NOT IN UNNEST",
+}
+
+
+def table_path(name, data_dir=None):
+    return os.path.join(data_dir or DATA_DIR, f"{name}.parquet")
+
+
+def _to_pandas(table, dtype_backend="pyarrow"):
+    if dtype_backend == "numpy":
+        # NumPy dtypes: NULL numbers are NaN, like bigquery's to_dataframe floats
+        return table.to_pandas()
+    # Arrow-backed columns: no copy into NumPy object arrays for strings
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def _python_value(value):
+    # NumPy scalars (e.g. from a DataFrame column) as the Python types BigQuery expects
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _query_parameter(name, value):
+    def bq_type(v):
+        if isinstance(v, bool):
+            return "BOOL"
+        if isinstance(v, int):
+            return "INT64"
+        if isinstance(v, float):
+            return "FLOAT64"
+        if isinstance(v, datetime.datetime):
+            return "TIMESTAMP"
+        if isinstance(v, datetime.date):
+            return "DATE"
+        return "STRING"
+
+    if isinstance(value, (list, tuple, set, np.ndarray)):
+        values = [_python_value(v) for v in value]
+        return bigquery.ArrayQueryParameter(
+            name, bq_type(values[0]) if values else "STRING", values
+        )
+    value = _python_value(value)
+    return bigquery.ScalarQueryParameter(name, bq_type(value), value)
+
+
+def _warehouse_query(name, project_id, dataset_id, columns, filters):
+    """Builds the SELECT (and its query parameters) matching a local read."""
+    select = ", ".join(f"`{c}`" for c in columns) if columns else "*"
+    conditions = []
+    parameters = []
+    for i, (column, op, value) in enumerate(filters or []):
+        if op not in _SQL_OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        param = f"p{i}"
+        conditions.append(f"`{column}` {_SQL_OPERATORS[op]}(@{param})")
+        parameters.append(_query_parameter(param, value))
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"SELECT {select} FROM `{project_id}.{dataset_id}.{name}`{where}"
+    return sql, parameters
+
+
+def read_table(
+    name,
+    columns=None,
+    filters=None,
+    data_dir=None,
+    warehouse="never",
+    project_id=None,
+    dataset_id=None,
+    cache=False,
+    client=None,
+    dtype_backend="pyarrow",
+):
+    """
+    Read one of the lab tables, from local Parquet unless told otherwise.
+
+    The local read memory-maps the file, only decodes the requested columns
+    and uses the row group statistics to skip row groups excluded by
+    ``filters``. Columns come back Arrow-backed (``pd.ArrowDtype``) unless
+    ``dtype_backend="numpy"``.
+
+    Args:
+        name (str): Table name, e.g. "revenue" or "customers"
+        columns (list, optional): Columns to read, all when None
+        filters (list, optional): ANDed (column, op, value) tuples, op is one
+            of =, ==, !=, <, <=, >, >=, in, not in
+        data_dir (str, optional): Directory of the parquet files, DATA_DIR by default
+        warehouse (str): "never" to only read local files, "fallback" to query
+            BigQuery when the local file does not exist, "always" to query
+            BigQuery
+        project_id (str, optional): Google Cloud project ID, for warehouse
+            reads (the client's project when None)
+        dataset_id (str, optional): BigQuery dataset ID, for warehouse reads
+        cache (bool): Save full-table warehouse reads to the local parquet file
+        client (bigquery.Client, optional): Client for warehouse reads
+        dtype_backend (str): "pyarrow" for Arrow-backed columns (NULLs are
+            pd.NA), "numpy" for NumPy dtypes (NULL numbers are NaN, integer
+            columns with NULLs become float)
+
+    Returns:
+        pandas.DataFrame: The table
+    """
+    if warehouse not in WAREHOUSE_MODES:
+        raise ValueError(f"warehouse must be one of {WAREHOUSE_MODES}, got {warehouse}")
+    if dtype_backend not in DTYPE_BACKENDS:
+        raise ValueError(
+            f"dtype_backend must be one of {DTYPE_BACKENDS}, got {dtype_backend}"
+        )
+
+    path = table_path(name, data_dir)
+    if warehouse != "always" and os.path.exists(path):
+        table = pq.read_table(path, columns=columns, filters=filters, memory_map=True)
+        return _to_pandas(table, dtype_backend)
+
+    if warehouse == "never":
+        raise FileNotFoundError(
+            f"{path} not found. Generate the data with src/datagen/datagen.py, or "
+            "pass warehouse='fallback' to read it from BigQuery."
+        )
+
+    if client is None:
+        client = bigquery.Client(project=project_id)
+
+    sql, parameters = _warehouse_query(
+        name, project_id or client.project, dataset_id, columns, filters
+    )
+    job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+    table = client.query(sql, job_config=job_config).to_arrow()
+
+    if cache and not columns and not filters:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path)
+    return _to_pandas(table, dtype_backend)
+
+
+def iter_table_batches(
+    name,
+    columns=None,
+    filters=None,
+    batch_size=100_000,
+    data_dir=None,
+    dtype_backend="pyarrow",
+):
+    """
+    Stream a local parquet table in DataFrame chunks, with the same column
+    projection and predicate pushdown as read_table.
+
+    Yields:
+        pandas.DataFrame: Up to batch_size rows
+    """
+    dataset = ds.dataset(table_path(name, data_dir), format="parquet")
+    expression = pq.filters_to_expression(filters) if filters else None
+    for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+        if batch.num_rows:
+            yield _to_pandas(batch, dtype_backend)
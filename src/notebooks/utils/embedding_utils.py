@@ -0,0 +1,296 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+from google.cloud import bigquery
+
+EMBEDDINGS_TABLE = "customer_description_embeddings"
+DESCRIPTIONS_TABLE = "customer_descriptions"
+EMBEDDING_COLUMN = "customer_description_embedding"
+EMBEDDING_DIMENSIONALITY = 768
+
+
+def content_hash(text):
+    """Hex SHA-256 of a description, identical to BigQuery's TO_HEX(SHA256(text))."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def refresh_description_embeddings(
+    project_id, dataset_id, task_type="SEMANTIC_SIMILARITY", client=None
+):
+    """
+    Incrementally refresh the customer description embeddings in BigQuery.
+
+    Only descriptions that are new, or whose content hash differs from the one
+    stored next to the embedding, are sent to ML.GENERATE_EMBEDDING. The results
+    are MERGEd into the embeddings table, and embeddings of customers that no
+    longer have a description are deleted. A table created by the previous
+    CREATE OR REPLACE statement is upgraded in place, its rows get embedded once
+    more to record their hash.
+
+    Args:
+        project_id (str): Google Cloud project ID
+        dataset_id (str): BigQuery dataset ID
+        task_type (str): Embedding task type
+        client (bigquery.Client, optional): Client to run the queries with
+
+    Returns:
+        dict: Number of embedded and deleted rows
+    """
+    if client is None:
+        client = bigquery.Client(project=project_id)
+
+    embeddings_table = f"{project_id}.{dataset_id}.{EMBEDDINGS_TABLE}"
+    descriptions_table = f"{project_id}.{dataset_id}.{DESCRIPTIONS_TABLE}"
+    model = f"{project_id}.{dataset_id}.google-textembedding"
+
+    create_sql = f"""
+    CREATE TABLE IF NOT EXISTS `{embeddings_table}` (
+      customer_id STRING,
+      {EMBEDDING_COLUMN} ARRAY<FLOAT64>,
+      content_hash STRING
+    );
+    ALTER TABLE `{embeddings_table}` ADD COLUMN IF NOT EXISTS content_hash STRING;"""
+    client.query_and_wait(create_sql)
+
+    merge_sql = f"""
+    MERGE `{embeddings_table}` t
+    USING (
+      SELECT
+        customer_id,
+        content_hash,
+        ml_generate_embedding_result AS {EMBEDDING_COLUMN}
+      FROM ML.GENERATE_EMBEDDING(
+        MODEL `{model}`,
+        (
+          SELECT
+            d.customer_id,
+            d.customer_description AS content,
+            TO_HEX(SHA256(d.customer_description)) AS content_hash
+          FROM `{descriptions_table}` d
+          LEFT JOIN `{embeddings_table}` e ON d.customer_id = e.customer_id
+          WHERE d.customer_description IS NOT NULL
+            AND e.content_hash IS DISTINCT FROM TO_HEX(SHA256(d.customer_description))
+        ),
+        STRUCT(
+          TRUE AS flatten_json_output,
+          '{task_type}' AS task_type,
+          {EMBEDDING_DIMENSIONALITY} AS output_dimensionality
+        )
+      )
+      WHERE ml_generate_embedding_status = ''
+    ) s
+    ON t.customer_id = s.customer_id
+    WHEN MATCHED THEN UPDATE SET
+      {EMBEDDING_COLUMN} = s.{EMBEDDING_COLUMN},
+      content_hash = s.content_hash
+    WHEN NOT MATCHED THEN
+      INSERT (customer_id, {EMBEDDING_COLUMN}, content_hash)
+      VALUES (s.customer_id, s.{EMBEDDING_COLUMN}, s.content_hash)"""
+    merge_job = client.query(merge_sql)
+    merge_job.result()
+
+    delete_sql = f"""
+    DELETE FROM `{embeddings_table}` e
+    WHERE NOT EXISTS (
+      SELECT 1 FROM `{descriptions_table}` d
+      WHERE d.customer_id = e.customer_id AND d.customer_description IS NOT NULL
+    )"""
+    delete_job = client.query(delete_sql)
+    delete_job.result()
+
+    counts = {
+        "embedded": merge_job.num_dml_affected_rows or 0,
+        "deleted": delete_job.num_dml_affected_rows or 0,
+    }
+    print(f"Embeddings refreshed in {embeddings_table}: {counts}")
+    return counts
+
+
+def genai_embed_fn(
+    project_id,
+    location="us-central1",
+    task_type="SEMANTIC_SIMILARITY",
+    model="text-embedding-004",
+):
+    """
+    Build an embedding function backed by the Vertex AI text embedding model.
+
+    Returns:
+        callable: Takes a list of texts and returns a float32 array of shape
+            (len(texts), EMBEDDING_DIMENSIONALITY)
+    """
+    from google import genai
+    from google.genai import types
+
+    client = genai.Client(project=project_id, location=location, vertexai=True)
+    config = types.EmbedContentConfig(
+        task_type=task_type, output_dimensionality=EMBEDDING_DIMENSIONALITY
+    )
+
+    def embed(texts):
+        response = client.models.embed_content(
+            model=model, contents=list(texts), config=config
+        )
+        return np.asarray([e.values for e in response.embeddings], dtype=np.float32)
+
+    return embed
+
+
+class LocalEmbeddingStore:
+    """
+    Local, memory-mappable copy of the customer description embeddings.
+
+    Vectors are stored L2-normalised as float32 in ``embeddings.npy`` and the
+    matching ``customer_id`` / ``content_hash`` rows in ``embeddings_index.parquet``
+    (row ``i`` of one is row ``i`` of the other). Loading maps the vectors with
+    ``mmap_mode="r"`` so searches never read more than the pages they touch.
+
+    A refresh writes both files to temporary names and only then renames them
+    into place, back to back; ``load`` refuses files whose lengths differ.
+    """
+
+    def __init__(self, directory="data/embeddings"):
+        """
+        Args:
+            directory (str): Directory holding the store files
+        """
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "embeddings.npy")
+        self.index_path = os.path.join(directory, "embeddings_index.parquet")
+
+    def exists(self):
+        return os.path.exists(self.vectors_path) and os.path.exists(self.index_path)
+
+    @staticmethod
+    def _empty():
+        index = pd.DataFrame(
+            {"customer_id": pd.Series(dtype=str), "content_hash": pd.Series(dtype=str)}
+        )
+        return index, np.empty((0, EMBEDDING_DIMENSIONALITY), dtype=np.float32)
+
+    def load(self):
+        """
+        Returns:
+            tuple: (index DataFrame, memory-mapped vectors)
+
+        Raises:
+            ValueError: The index and the vectors do not have the same length
+        """
+        if not self.exists():
+            return self._empty()
+
+        index = pd.read_parquet(self.index_path)
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        if len(index) != len(vectors):
+            raise ValueError(
+                f"Embedding store {self.directory} is inconsistent: {len(index)} index "
+                f"rows for {len(vectors)} vectors. Run refresh to rebuild it."
+            )
+        return index, vectors
+
+    def refresh(self, descriptions_df, embed_fn, batch_size=100):
+        """
+        Embed only the new or changed descriptions and rewrite the store.
+
+        Args:
+            descriptions_df (pandas.DataFrame): customer_id and customer_description
+            embed_fn (callable): Maps a list of texts to an array of vectors
+            batch_size (int): Number of texts per embed_fn call
+
+        Returns:
+            dict: Number of embedded, kept and deleted rows
+        """
+        descriptions_df = descriptions_df.dropna(subset=["customer_description"])
+        current = pd.DataFrame(
+            {
+                "customer_id": descriptions_df["customer_id"].to_numpy(),
+                "content_hash": [
+                    content_hash(text) for text in descriptions_df["customer_description"]
+                ],
+                "content": descriptions_df["customer_description"].to_numpy(),
+            }
+        ).drop_duplicates("customer_id", keep="last")
+
+        try:
+            index, vectors = self.load()
+        except ValueError as e:
+            # Interrupted or corrupt store: embed everything again
+            print(f"{e} Re-embedding all descriptions.")
+            index, vectors = self._empty()
+        previous = index.assign(row=np.arange(len(index)))
+        merged = current.merge(
+            previous, on="customer_id", how="left", suffixes=("", "_previous")
+        )
+        unchanged = merged["content_hash"] == merged["content_hash_previous"]
+        kept = merged[unchanged]
+        changed = merged[~unchanged]
+
+        new_index = pd.concat(
+            [kept[["customer_id", "content_hash"]], changed[["customer_id", "content_hash"]]],
+            ignore_index=True,
+        )
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.vectors_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(
+            tmp_path,
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(new_index), EMBEDDING_DIMENSIONALITY),
+        )
+        if len(kept):
+            out[: len(kept)] = vectors[kept["row"].to_numpy(dtype=np.int64)]
+
+        texts = changed["content"].tolist()
+        for start in range(0, len(texts), batch_size):
+            batch = np.asarray(embed_fn(texts[start : start + batch_size]), dtype=np.float32)
+            norms = np.linalg.norm(batch, axis=1, keepdims=True)
+            offset = len(kept) + start
+            out[offset : offset + len(batch)] = batch / np.where(norms == 0, 1, norms)
+        out.flush()
+        del out, vectors
+
+        tmp_index_path = self.index_path + ".tmp"
+        new_index.to_parquet(tmp_index_path, index=False)
+        os.replace(tmp_path, self.vectors_path)
+        os.replace(tmp_index_path, self.index_path)
+
+        counts = {
+            "embedded": len(changed),
+            "kept": len(kept),
+            "deleted": int(len(index) - len(kept) - changed["row"].notna().sum()),
+        }
+        print(f"Local embeddings refreshed in {self.directory}: {counts}")
+        return counts
+
+    def search(self, query_vector, top_k=5):
+        """
+        Cosine search over the stored vectors.
+
+        Args:
+            query_vector (array-like): Embedding of the search text
+            top_k (int): Number of results
+
+        Returns:
+            pandas.DataFrame: customer_id and distance (1 - cosine similarity),
+                closest first
+        """
+        index, vectors = self.load()
+        if len(index) == 0:
+            return pd.DataFrame({"customer_id": [], "distance": []})
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        similarity = vectors @ query
+
+        top_k = min(top_k, len(similarity))
+        top = np.argpartition(-similarity, top_k - 1)[:top_k]
+        top = top[np.argsort(-similarity[top])]
+        return pd.DataFrame(
+            {
+                "customer_id": index["customer_id"].to_numpy()[top],
+                "distance": 1.0 - similarity[top],
+            }
+        )
@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+TIMESFM_CHECKPOINT = "google/timesfm-1.0-200m-pytorch"
+
+# Loaded TimesFM models, keyed by their hyperparameters, shared by all forecasters
+_TIMESFM_MODELS = {}
+_TIMESFM_LOCK = threading.Lock()
+
+
+def build_revenue_series(revenue_df, freq="D"):
+    """
+    Build one revenue series per product x category.
+
+    Args:
+        revenue_df (pandas.DataFrame): Output of
+            SyntheticDataGenerator.generate_revenue_data
+        freq (str): Pandas frequency to aggregate the revenue to
+
+    Returns:
+        pandas.DataFrame: Long format with unique_id, ds and y, every series
+            covering the full date range (missing periods are 0)
+    """
+    df = revenue_df[["date", "product", "category", "revenue"]].copy()
+    df["date"] = pd.to_datetime(df["date"])
+
+    wide = (
+        df.groupby([pd.Grouper(key="date", freq=freq), "product", "category"])["revenue"]
+        .sum()
+        .unstack(["product", "category"])
+    )
+    wide = wide.reindex(
+        pd.date_range(wide.index.min(), wide.index.max(), freq=freq)
+    ).fillna(0.0)
+    wide.columns = [f"{product} | {category}" for product, category in wide.columns]
+    wide.index.name = "ds"
+
+    series = wide.stack().rename("y").reset_index()
+    series.columns = ["ds", "unique_id", "y"]
+    return series[["unique_id", "ds", "y"]].sort_values(["unique_id", "ds"], ignore_index=True)
+
+
+class SeasonalNaiveBackend:
+    """Repeats the last season of every series. Fast, offline baseline."""
+
+    name = "seasonal_naive"
+
+    def __init__(self, season_length=7, batch_size=1024):
+        self.season_length = season_length
+        self.batch_size = batch_size
+
+    def cache_key(self):
+        """Identifies the backend and every setting that changes its forecasts."""
+        return f"{self.name}|season_length={self.season_length}"
+
+    def forecast(self, inputs, horizon, freq="D"):
+        """
+        Args:
+            inputs (list): One 1-D array of history per series
+            horizon (int): Number of periods to forecast
+            freq (str): Pandas frequency of the series
+
+        Returns:
+            numpy.ndarray: Point forecasts of shape (len(inputs), horizon)
+        """
+        out = np.empty((len(inputs), horizon))
+        steps = np.arange(horizon)
+        for i, values in enumerate(inputs):
+            season = np.asarray(values[-self.season_length :], dtype=np.float64)
+            if len(season) == 0:
+                out[i] = 0.0
+            else:
+                out[i] = season[steps % len(season)]
+        return out
+
+
+def timesfm_freq(freq):
+    """
+    Map a pandas frequency to TimesFM's frequency category: 0 for daily and
+    finer, 1 for weekly and monthly, 2 for quarterly and longer.
+    """
+    # Length of one period, starting on a Monday at the start of a quarter
+    start = pd.Timestamp("2024-01-01")
+    period = start + pd.tseries.frequencies.to_offset(freq) - start
+    if period <= pd.Timedelta(days=1):
+        return 0
+    if period < pd.Timedelta(days=80):
+        return 1
+    return 2
+
+
+class TimesFmBackend:
+    """
+    TimesFM, loaded once per process and shared between forecasters.
+
+    Pass ``model`` to reuse an already loaded ``timesfm.TimesFm``; it is then
+    shared with every other backend of the same settings. ``checkpoint`` should
+    name the checkpoint it was loaded from (it is part of the cache key).
+    """
+
+    name = "timesfm"
+
+    def __init__(
+        self,
+        per_core_batch_size=32,
+        horizon_len=128,
+        backend="cpu",
+        checkpoint=TIMESFM_CHECKPOINT,
+        model=None,
+    ):
+        if model is not None:
+            per_core_batch_size = getattr(model, "per_core_batch_size", per_core_batch_size)
+            horizon_len = getattr(model, "horizon_len", horizon_len)
+        self.per_core_batch_size = per_core_batch_size
+        self.horizon_len = horizon_len
+        self.backend = backend
+        self.checkpoint = checkpoint
+        if model is not None:
+            with _TIMESFM_LOCK:
+                _TIMESFM_MODELS[self._model_key()] = model
+
+    def _model_key(self):
+        return (self.per_core_batch_size, self.horizon_len, self.backend, self.checkpoint)
+
+    def cache_key(self):
+        return f"{self.name}|checkpoint={self.checkpoint}|horizon_len={self.horizon_len}"
+
+    @property
+    def model(self):
+        key = self._model_key()
+        with _TIMESFM_LOCK:
+            if key not in _TIMESFM_MODELS:
+                import timesfm
+
+                _TIMESFM_MODELS[key] = timesfm.TimesFm(
+                    hparams=timesfm.TimesFmHparams(
+                        backend=self.backend,
+                        per_core_batch_size=self.per_core_batch_size,
+                        horizon_len=self.horizon_len,
+                    ),
+                    checkpoint=timesfm.TimesFmCheckpoint(
+                        huggingface_repo_id=self.checkpoint
+                    ),
+                )
+            return _TIMESFM_MODELS[key]
+
+    @property
+    def batch_size(self):
+        # per_core_batch_size times the number of devices TimesFM runs on
+        return getattr(self.model, "global_batch_size", self.per_core_batch_size)
+
+    def forecast(self, inputs, horizon, freq="D"):
+        if horizon > self.horizon_len:
+            raise ValueError(
+                f"horizon {horizon} is longer than horizon_len {self.horizon_len}"
+            )
+        category = timesfm_freq(freq)
+        point_forecast, _ = self.model.forecast(inputs, freq=[category] * len(inputs))
+        return np.asarray(point_forecast)[:, :horizon]
+
+
+def load_backend(name="auto", **kwargs):
+    """
+    Args:
+        name (str): "timesfm", "seasonal_naive", or "auto" to use TimesFM when
+            it is installed and fall back to the seasonal naive baseline
+
+    Returns:
+        A forecasting backend
+    """
+    if name == "auto":
+        try:
+            import timesfm  # noqa: F401
+
+            name = "timesfm"
+        except ImportError:
+            print("timesfm is not installed, using the seasonal naive baseline")
+            name = "seasonal_naive"
+
+    if name == "timesfm":
+        return TimesFmBackend(**kwargs)
+    if name == "seasonal_naive":
+        return SeasonalNaiveBackend(**kwargs)
+    raise ValueError(f"Unknown forecasting backend: {name}")
+
+
+class RevenueForecaster:
+    """
+    Forecasts many series in one pass, in batches sized for the backend.
+
+    Forecasts are cached on disk, keyed on a hash of the input series, the
+    backend and the horizon, so re-running on unchanged data is free.
+    """
+
+    def __init__(self, backend=None, cache_dir=".forecast_cache"):
+        """
+        Args:
+            backend: Forecasting backend, see load_backend (default "auto")
+            cache_dir (str, optional): Directory for cached forecasts, None to
+                disable caching
+        """
+        self.backend = backend if backend is not None else load_backend()
+        self.cache_dir = cache_dir
+
+    def _cache_path(self, series_df, horizon, freq):
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(series_df, index=False).to_numpy().tobytes())
+        digest.update(f"{self.backend.cache_key()}|{horizon}|{freq}".encode())
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}.parquet")
+
+    def forecast(self, series_df, horizon=30, freq="D"):
+        """
+        Args:
+            series_df (pandas.DataFrame): unique_id, ds and y, e.g. from
+                build_revenue_series
+            horizon (int): Number of periods to forecast
+            freq (str): Pandas frequency of the series
+
+        Returns:
+            pandas.DataFrame: unique_id, ds and forecast for every series
+        """
+        series_df = series_df[["unique_id", "ds", "y"]].sort_values(
+            ["unique_id", "ds"], ignore_index=True
+        )
+
+        cache_path = None
+        if self.cache_dir:
+            cache_path = self._cache_path(series_df, horizon, freq)
+            if os.path.exists(cache_path):
+                return pd.read_parquet(cache_path)
+
+        groups = series_df.groupby("unique_id", sort=False)
+        ids = []
+        values = []
+        for uid, group in groups:
+            ids.append(uid)
+            values.append(group["y"].to_numpy(dtype=np.float32))
+        last_ds = groups["ds"].max()
+
+        batch_size = self.backend.batch_size
+        point_forecast = np.empty((len(ids), horizon))
+        for start in range(0, len(ids), batch_size):
+            batch = values[start : start + batch_size]
+            point_forecast[start : start + len(batch)] = self.backend.forecast(
+                batch, horizon, freq=freq
+            )
+
+        offset = pd.tseries.frequencies.to_offset(freq)
+        forecast_ds = [
+            pd.date_range(last_ds[uid] + offset, periods=horizon, freq=freq) for uid in ids
+        ]
+        forecast_df = pd.DataFrame(
+            {
+                "unique_id": np.repeat(ids, horizon),
+                "ds": np.concatenate(forecast_ds) if ids else pd.DatetimeIndex([]),
+                "forecast": point_forecast.reshape(-1),
+            }
+        )
+        forecast_df["model"] = self.backend.name
+
+        if cache_path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            forecast_df.to_parquet(cache_path, index=False)
+        return forecast_df
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Forecast revenue for every product x category series."
+    )
+    parser.add_argument("--input", default="data/revenue.parquet", help="Revenue parquet file")
+    parser.add_argument("--output", default="revenue_forecast.csv", help="Output CSV file")
+    parser.add_argument("--horizon", type=int, default=30, help="Periods to forecast")
+    parser.add_argument("--freq", default="D", help="Pandas frequency of the series")
+    parser.add_argument(
+        "--backend",
+        default="auto",
+        choices=["auto", "timesfm", "seasonal_naive"],
+        help="Forecasting backend",
+    )
+    parser.add_argument("--cache-dir", default=".forecast_cache", help="Forecast cache directory")
+    args = parser.parse_args()
+
+    series = build_revenue_series(pd.read_parquet(args.input), freq=args.freq)
+    forecaster = RevenueForecaster(load_backend(args.backend), cache_dir=args.cache_dir)
+    forecast = forecaster.forecast(series, horizon=args.horizon, freq=args.freq)
+    forecast.to_csv(args.output, index=False)
+    print(
+        f"Forecast {series['unique_id'].nunique()} series x {args.horizon} periods "
+        f"to {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,30 @@
+import copy
 import requests
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import google.auth
 import google.auth.transport.requests
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
 
+CONNECTIONS_BASE_URL = "https://bigqueryconnection.googleapis.com/v1"
+RESOURCE_MANAGER_BASE_URL = "https://cloudresourcemanager.googleapis.com/v1"
+TEXT_EMBEDDING_MODEL_NAME = "google-textembedding"
+VERTEX_AI_USER_ROLE = "roles/aiplatform.user"
+IAM_PROPAGATION_SECONDS = 60
+IAM_POLICY_MAX_ATTEMPTS = 5
+# Version 3 policies include conditional role bindings
+IAM_POLICY_VERSION = 3
+
+
+class ApiRequestError(RuntimeError):
+    """Raised when a Google Cloud REST API call does not return 200."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
 
 def get_auth_headers():
     """Get authentication headers for Google Cloud API calls."""
@@ -18,9 +39,13 @@ def get_auth_headers():
     }
 
 
-def make_api_request(url: str, method: str, data: dict = None):
-    """Make an API request with proper authentication."""
-    headers = get_auth_headers()
+def make_api_request(url: str, method: str, data: dict = None, headers: dict = None):
+    """Make an API request with proper authentication.
+
+    Pass ``headers`` to reuse an already refreshed token across many calls.
+    """
+    if headers is None:
+        headers = get_auth_headers()
 
     if method == "GET":
         response = requests.get(url, headers=headers)
@@ -42,7 +67,56 @@ def make_api_request(url: str, method: str, data: dict = None):
             f"API request failed -> Status: {response.status_code} "
             f"Text: {response.text}"
         )
-        raise RuntimeError(error)
+        raise ApiRequestError(error, response.status_code)
+
+
+def list_vertex_ai_connections(project_id, bigquery_location, headers=None):
+    """Lists the connections of a location, keyed by connection id.
+
+    Returns:
+        dict: Connection id -> service account id of its cloud resource
+    """
+    url = (
+        f"{CONNECTIONS_BASE_URL}/projects/{project_id}/locations/"
+        f"{bigquery_location}/connections"
+    )
+
+    connections = {}
+    page_token = None
+    while True:
+        page_url = f"{url}?pageToken={page_token}" if page_token else url
+        json_result = make_api_request(page_url, "GET", headers=headers)
+        for item in json_result.get("connections", []):
+            print(f"Found connection: {item['name']}")
+            connection_id = item["name"].rsplit("/", 1)[-1]
+            connections[connection_id] = item.get("cloudResource", {}).get(
+                "serviceAccountId"
+            )
+        page_token = json_result.get("nextPageToken")
+        if not page_token:
+            return connections
+
+
+def create_vertex_ai_connection_resource(
+    project_id, bigquery_location, vertex_ai_connection_name, headers=None
+):
+    """Creates a Vertex AI connection without checking whether it exists."""
+    print("Creating new Vertex AI Connection...")
+    create_url = (
+        f"{CONNECTIONS_BASE_URL}/projects/{project_id}/locations/"
+        f"{bigquery_location}/connections?connectionId={vertex_ai_connection_name}"
+    )
+
+    request_body = {
+        "friendlyName": "notebook_connection",
+        "description": "Vertex AI Notebooks Connection for Data Analytics",
+        "cloudResource": {},
+    }
+
+    json_result = make_api_request(create_url, "POST", request_body, headers=headers)
+    service_account_id = json_result["cloudResource"]["serviceAccountId"]
+    print("Vertex AI Connection created:", service_account_id)
+    return service_account_id
 
 
 def create_vertex_ai_connection(params):
@@ -51,120 +125,302 @@ def create_vertex_ai_connection(params):
     bigquery_location = params["bigquery_location"]
     vertex_ai_connection_name = params["vertex_ai_connection_name"]
 
-    base_url = "https://bigqueryconnection.googleapis.com/v1"
-    connections_path = (
-        f"projects/{project_id}/locations/{bigquery_location}/connections"
-    )
-    url = f"{base_url}/{connections_path}"
-
     # Check if connection exists
     try:
-        json_result = make_api_request(url, "GET")
         print(f"Checking existing connections...")
-
-        if "connections" in json_result:
-            for item in json_result["connections"]:
-                print(f"Found connection: {item['name']}")
-                conn_path = (
-                    f"/locations/{bigquery_location}/connections/"
-                    f"{vertex_ai_connection_name}"
-                )
-                if item["name"].endswith(conn_path):
-                    print("Connection already exists")
-                    return item["cloudResource"]["serviceAccountId"]
+        connections = list_vertex_ai_connections(project_id, bigquery_location)
     except Exception as e:
         print(f"Error checking connections: {str(e)}")
         raise
 
-    # Create new connection
-    print("Creating new Vertex AI Connection...")
-    create_url = f"{url}?connectionId={vertex_ai_connection_name}"
-
-    request_body = {
-        "friendlyName": "notebook_connection",
-        "description": "Vertex AI Notebooks Connection for Data Analytics",
-        "cloudResource": {},
-    }
+    if vertex_ai_connection_name in connections:
+        print("Connection already exists")
+        return connections[vertex_ai_connection_name]
 
     try:
-        json_result = make_api_request(create_url, "POST", request_body)
-        service_account_id = json_result["cloudResource"]["serviceAccountId"]
-        print("Vertex AI Connection created:", service_account_id)
-        return service_account_id
+        return create_vertex_ai_connection_resource(
+            project_id, bigquery_location, vertex_ai_connection_name
+        )
     except Exception as e:
         print(f"Error creating connection: {str(e)}")
         raise
 
 
-def set_project_level_iam_policy(params, accountWithPrefix, role):
-    """Sets the Project Level IAM policy."""
-
-    # Get the current bindings (if the account has access then skip)
+def get_project_iam_policy(project_id, headers=None):
+    """Gets the Project Level IAM policy, including its etag and conditions."""
     # https://cloud.google.com/resource-manager/reference/rest/v1/projects/getIamPolicy
-    project_id = params["project_id"]
-
-    url = f"https://cloudresourcemanager.googleapis.com/v1/projects/{project_id}:getIamPolicy"
-
-    request_body = {}
-    json_result = make_api_request(url, "POST", request_body)
-    print(f"setProjectLevelIamPolicy (GET) json_result: {json_result}")
-
-    # Test to see if permissions exist
-    if "bindings" in json_result:
-        for item in json_result["bindings"]:
-            if item["role"] == role:
-                members = item["members"]
-                for member in members:
-                    if member == accountWithPrefix:
-                        print("Permissions exist")
-                        return
-
-    # Take the existing bindings and we need to append the new permission
-    # Otherwise we loose the existing permissions
-    if "bindings" in json_result:
-        bindings = json_result["bindings"]
-    else:
-        bindings = []
-
-    new_permission = {"role": role, "members": [accountWithPrefix]}
-
-    bindings.append(new_permission)
-
+    url = f"{RESOURCE_MANAGER_BASE_URL}/projects/{project_id}:getIamPolicy"
+    request_body = {"options": {"requestedPolicyVersion": IAM_POLICY_VERSION}}
+    return make_api_request(url, "POST", request_body, headers=headers)
+
+
+def add_iam_bindings(policy, members_by_role):
+    """Adds members to a policy in place and returns the ones that were missing.
+
+    Members are appended to the existing unconditional binding for the role
+    when there is one, so the role is never listed twice. Conditional bindings
+    are left alone, they would only grant the role under their condition.
+    """
+    bindings = policy.setdefault("bindings", [])
+    added = []
+    for role, members in members_by_role.items():
+        binding = next(
+            (
+                item
+                for item in bindings
+                if item["role"] == role and "condition" not in item
+            ),
+            None,
+        )
+        if binding is None:
+            binding = {"role": role, "members": []}
+            bindings.append(binding)
+        for member in members:
+            if member not in binding["members"]:
+                binding["members"].append(member)
+                added.append((member, role))
+    return added
+
+
+def update_project_iam_policy(project_id, members_by_role, policy=None, headers=None):
+    """Grants the given roles on a project using etag-based optimistic concurrency.
+
+    The whole policy (etag included) is sent back to setIamPolicy, so a
+    concurrent writer makes the call fail with 409 instead of silently
+    dropping its bindings. On conflict the policy is read again and the
+    missing bindings are re-applied.
+
+    Args:
+        project_id (str): Google Cloud project ID
+        members_by_role (dict): Role -> list of members (with type prefix)
+        policy (dict, optional): Already fetched policy to start from, it is
+            not modified
+        headers (dict, optional): Authentication headers to reuse
+
+    Returns:
+        list: (member, role) pairs that were added
+    """
     # https://cloud.google.com/resource-manager/reference/rest/v1/projects/setIamPolicy
-    url = f"https://cloudresourcemanager.googleapis.com/v1/projects/{project_id}:setIamPolicy"
+    url = f"{RESOURCE_MANAGER_BASE_URL}/projects/{project_id}:setIamPolicy"
+
+    for attempt in range(1, IAM_POLICY_MAX_ATTEMPTS + 1):
+        if policy is None:
+            policy = get_project_iam_policy(project_id, headers=headers)
+        else:
+            policy = copy.deepcopy(policy)
+
+        added = add_iam_bindings(policy, members_by_role)
+        if not added:
+            print("Permissions exist")
+            return []
+
+        # Written back as version 3 so conditional bindings are kept as they are
+        policy["version"] = IAM_POLICY_VERSION
+        try:
+            make_api_request(url, "POST", {"policy": policy}, headers=headers)
+        except ApiRequestError as e:
+            if e.status_code != 409 or attempt == IAM_POLICY_MAX_ATTEMPTS:
+                raise
+            print(f"IAM policy for {project_id} changed concurrently, retrying...")
+            policy = None
+            time.sleep(attempt)
+            continue
+
+        for member, role in added:
+            print(f"Project Level IAM Permissions set for {member} {role}")
+        return added
 
-    request_body = {"policy": {"bindings": bindings}}
 
-    print(f"Permission bindings: {bindings}")
-
-    json_result = make_api_request(url, "POST", request_body)
-    print()
-    print(f"json_result: {json_result}")
-    print()
-    print(f"Project Level IAM Permissions set for {accountWithPrefix} {role}")
+def set_project_level_iam_policy(params, accountWithPrefix, role):
+    """Sets the Project Level IAM policy."""
+    update_project_iam_policy(params["project_id"], {role: [accountWithPrefix]})
 
 
-def create_text_embedding_model(params):
+def create_text_embedding_model(params, client=None):
     """Creates a text embedding model."""
     project_id = params["project_id"]
     bigquery_location = params["bigquery_location"]
     vertex_ai_connection_name = params["vertex_ai_connection_name"]
     dataset_id = params["dataset_id"]
-    sql = f"""CREATE MODEL IF NOT EXISTS `{project_id}.{dataset_id}.google-textembedding`
+    sql = f"""CREATE MODEL IF NOT EXISTS `{project_id}.{dataset_id}.{TEXT_EMBEDDING_MODEL_NAME}`
     REMOTE WITH CONNECTION `{project_id}.{bigquery_location}.{vertex_ai_connection_name}`
     OPTIONS (endpoint = 'text-embedding-004');"""
-    client = bigquery.Client()
+    if client is None:
+        client = bigquery.Client()
     client.query_and_wait(sql)
-    print(f"Text embedding model created: {project_id}.{dataset_id}.google-textembedding")
+    print(f"Text embedding model created: {project_id}.{dataset_id}.{TEXT_EMBEDDING_MODEL_NAME}")
+
+
+class TextEmbeddingProvisioner:
+    """
+    Provisions the text embedding model for many datasets at once.
+
+    The desired state (connections, IAM bindings and models) is derived from a
+    list of ``params`` dicts. Existing state is read once per connection
+    location, project policy and dataset, and cached for the lifetime of the
+    provisioner. Only the missing pieces are created, and calls that do not
+    depend on each other are issued in parallel:
+
+    1. connections, one per (project, location, connection name)
+    2. IAM bindings, one etag-guarded setIamPolicy per project
+    3. remote models, one per dataset
+    """
+
+    def __init__(self, max_workers=8, propagation_seconds=IAM_PROPAGATION_SECONDS):
+        """
+        Args:
+            max_workers (int): Maximum number of concurrent API calls
+            propagation_seconds (int): Time to wait after IAM bindings were added
+        """
+        self.max_workers = max_workers
+        self.propagation_seconds = propagation_seconds
+        self._lock = threading.Lock()
+        self._headers = None
+        self._bq_clients = {}
+        self._connections = {}
+        self._policies = {}
+        self._models = {}
+
+    def _auth_headers(self):
+        with self._lock:
+            if self._headers is None:
+                self._headers = get_auth_headers()
+            return self._headers
+
+    def _bq_client(self, project_id):
+        with self._lock:
+            if project_id not in self._bq_clients:
+                self._bq_clients[project_id] = bigquery.Client(project=project_id)
+            return self._bq_clients[project_id]
+
+    def _map(self, fn, items):
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            return list(pool.map(fn, items))
+
+    def _read_connections(self, key):
+        project_id, bigquery_location = key
+        if key not in self._connections:
+            self._connections[key] = list_vertex_ai_connections(
+                project_id, bigquery_location, headers=self._auth_headers()
+            )
+
+    def _read_policy(self, project_id):
+        if project_id not in self._policies:
+            self._policies[project_id] = get_project_iam_policy(
+                project_id, headers=self._auth_headers()
+            )
+
+    def _read_models(self, key):
+        project_id, dataset_id = key
+        if key not in self._models:
+            try:
+                models = self._bq_client(project_id).list_models(
+                    f"{project_id}.{dataset_id}"
+                )
+                self._models[key] = {model.model_id for model in models}
+            except NotFound:
+                self._models[key] = set()
+
+    def _create_connection(self, key):
+        project_id, bigquery_location, connection_name = key
+        service_account_id = create_vertex_ai_connection_resource(
+            project_id, bigquery_location, connection_name, headers=self._auth_headers()
+        )
+        self._connections[(project_id, bigquery_location)][
+            connection_name
+        ] = service_account_id
+
+    def _grant_roles(self, item):
+        project_id, members = item
+        try:
+            return update_project_iam_policy(
+                project_id,
+                {VERTEX_AI_USER_ROLE: sorted(members)},
+                policy=self._policies[project_id],
+                headers=self._auth_headers(),
+            )
+        finally:
+            # Stale once written (new etag) or when the write failed
+            self._policies.pop(project_id, None)
+
+    def _create_model(self, params):
+        create_text_embedding_model(params, client=self._bq_client(params["project_id"]))
+        self._models[(params["project_id"], params["dataset_id"])].add(
+            TEXT_EMBEDDING_MODEL_NAME
+        )
+
+    def provision(self, params_list):
+        """
+        Brings every dataset in ``params_list`` to the desired state.
+
+        Args:
+            params_list (list): Dicts with project_id, bigquery_location,
+                dataset_id and vertex_ai_connection_name
+
+        Returns:
+            dict: The connections, bindings and models that were created
+        """
+        connection_keys = {
+            (p["project_id"], p["bigquery_location"], p["vertex_ai_connection_name"])
+            for p in params_list
+        }
+        dataset_keys = {(p["project_id"], p["dataset_id"]) for p in params_list}
+        project_ids = {p["project_id"] for p in params_list}
+
+        # Single cached read of the current state
+        self._auth_headers()
+        self._map(self._read_connections, {k[:2] for k in connection_keys})
+        self._map(self._read_policy, project_ids)
+        self._map(self._read_models, dataset_keys)
+
+        missing_connections = sorted(
+            k for k in connection_keys if k[2] not in self._connections[k[:2]]
+        )
+        self._map(self._create_connection, missing_connections)
+
+        members_by_project = {}
+        for project_id, bigquery_location, connection_name in connection_keys:
+            service_account_id = self._connections[(project_id, bigquery_location)][
+                connection_name
+            ]
+            members_by_project.setdefault(project_id, set()).add(
+                f"serviceAccount:{service_account_id}"
+            )
+        bindings_added = [
+            binding
+            for added in self._map(self._grant_roles, members_by_project.items())
+            for binding in added
+        ]
+
+        missing_models = {}
+        for p in params_list:
+            key = (p["project_id"], p["dataset_id"])
+            if TEXT_EMBEDDING_MODEL_NAME not in self._models[key]:
+                missing_models.setdefault(key, p)
+
+        if bindings_added and missing_models and self.propagation_seconds:
+            print(
+                f"Waiting {self.propagation_seconds} seconds for IAM permissions "
+                "to propagate..."
+            )
+            time.sleep(self.propagation_seconds)
+
+        self._map(self._create_model, missing_models.values())
+
+        return {
+            "connections_created": missing_connections,
+            "bindings_added": bindings_added,
+            "models_created": sorted(missing_models),
+        }
+
+
+def provision_text_embedding_models(params_list, max_workers=8):
+    """Provisions the text embedding model for every dataset in params_list."""
+    return TextEmbeddingProvisioner(max_workers=max_workers).provision(params_list)
 
 
 def deploy_text_embedding_model(params):
-    vertex_ai_service_account_id = create_vertex_ai_connection(params)
-    set_project_level_iam_policy(
-        params,
-        f"serviceAccount:{vertex_ai_service_account_id}",
-        "roles/aiplatform.user",
-    )
-    print("Waiting 60 seconds for IAM permissions to propagate...")
-    time.sleep(60)
-    create_text_embedding_model(params)
+    return provision_text_embedding_models([params])
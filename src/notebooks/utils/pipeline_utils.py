@@ -0,0 +1,199 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+
+class BigQueryEngine:
+    """Runs pipeline SQL on BigQuery and reads table modification times."""
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else bigquery.Client()
+
+    def execute(self, sql, target=None):
+        self.client.query_and_wait(sql)
+
+    def last_modified(self, table):
+        """Returns the table's modification time, or None if it does not exist."""
+        try:
+            return self.client.get_table(table).modified
+        except NotFound:
+            return None
+
+
+class SQLiteEngine:
+    """
+    Local stand-in for BigQueryEngine backed by SQLite.
+
+    SQLite does not expose table modification times, so they are recorded
+    whenever a table is loaded or written by a pipeline node.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._modified = {}
+
+    def _touch(self, table):
+        self._modified[table] = datetime.now(timezone.utc)
+
+    def load_table(self, table, df):
+        """Create or replace ``table`` with the rows of a DataFrame."""
+        with self._lock:
+            df.to_sql(table, self.connection, if_exists="replace", index=False)
+            self._touch(table)
+
+    def execute(self, sql, target=None):
+        with self._lock:
+            self.connection.executescript(sql)
+            if target is not None:
+                self._touch(target)
+
+    def last_modified(self, table):
+        return self._modified.get(table)
+
+
+class SqlPipeline:
+    """
+    A DAG of SQL statements that each (re)build one table.
+
+    A node depends on every other node whose target is one of its inputs.
+    ``run`` executes nodes as soon as their dependencies are done, running
+    independent nodes concurrently, so the refresh takes as long as the
+    critical path. A node is skipped when its target is newer than all of its
+    inputs, i.e. none of them changed since it was last built, unless it is
+    volatile (e.g. uses CURRENT_DATE()) and its target was built before today.
+    """
+
+    def __init__(self, engine, max_workers=8):
+        """
+        Args:
+            engine: BigQueryEngine, SQLiteEngine or any object with
+                ``execute(sql, target)`` and ``last_modified(table)``
+            max_workers (int): Maximum number of statements running at once
+        """
+        self.engine = engine
+        self.max_workers = max_workers
+        self.nodes = {}
+
+    def add_node(self, name, sql, target, inputs=(), volatile=False):
+        """
+        Args:
+            name (str): Node name, used in the timings report
+            sql (str): Statement that builds ``target``
+            target (str): Table written by the statement
+            inputs (iterable): Tables read by the statement
+            volatile (bool): The result depends on the current date, so the
+                target is rebuilt once a day (UTC) even if no input changed
+        """
+        if name in self.nodes:
+            raise ValueError(f"Duplicate pipeline node: {name}")
+        self.nodes[name] = {
+            "sql": sql,
+            "target": target,
+            "inputs": list(inputs),
+            "volatile": volatile,
+        }
+        return self
+
+    def dependencies(self):
+        """Returns node name -> set of node names it depends on."""
+        producers = {node["target"]: name for name, node in self.nodes.items()}
+        deps = {
+            name: {producers[t] for t in node["inputs"] if t in producers}
+            for name, node in self.nodes.items()
+        }
+
+        # Reject cycles up front rather than waiting forever in run()
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Cycle in pipeline at node: {name}")
+            visiting.add(name)
+            for dep in deps[name]:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in deps:
+            visit(name)
+        return deps
+
+    def _is_up_to_date(self, node):
+        target_modified = self.engine.last_modified(node["target"])
+        if target_modified is None:
+            return False
+        if node["volatile"] and target_modified.date() < datetime.now(timezone.utc).date():
+            return False
+        for table in node["inputs"]:
+            input_modified = self.engine.last_modified(table)
+            if input_modified is None or input_modified > target_modified:
+                return False
+        return True
+
+    def _run_node(self, name, force):
+        node = self.nodes[name]
+        started = time.perf_counter()
+        if not force and self._is_up_to_date(node):
+            status = "skipped"
+        else:
+            self.engine.execute(node["sql"], target=node["target"])
+            status = "ran"
+        return {"status": status, "seconds": time.perf_counter() - started}
+
+    def run(self, force=False):
+        """
+        Run the pipeline.
+
+        Args:
+            force (bool): Rebuild every node even if its inputs did not change
+
+        Returns:
+            dict: Node name -> {"status", "seconds"}, in completion order.
+                Status is "ran", "skipped", "failed" or "not_run" (an
+                upstream node failed)
+        """
+        deps = self.dependencies()
+        pending = dict(deps)
+        results = {}
+        errors = []
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            while pending or running:
+                for name in [n for n, d in pending.items() if d <= results.keys()]:
+                    del pending[name]
+                    if any(results[d]["status"] in ("failed", "not_run") for d in deps[name]):
+                        results[name] = {"status": "not_run", "seconds": 0.0}
+                        print(f"{name}: not_run")
+                        continue
+                    running[pool.submit(self._run_node, name, force)] = name
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        results[name] = {"status": "failed", "seconds": 0.0}
+                        errors.append((name, e))
+                    print(
+                        f"{name}: {results[name]['status']} "
+                        f"({results[name]['seconds']:.1f}s)"
+                    )
+
+        print(f"Pipeline finished in {time.perf_counter() - started:.1f}s")
+        if errors:
+            name, error = errors[0]
+            raise RuntimeError(f"Pipeline node {name} failed: {error}") from error
+        return results
@@ -0,0 +1,395 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+SIGNALS_TABLE = "customer_segmentation_signals"
+PREDICTIONS_TABLE = "customer_clusters_predictions"
+KMEANS_MODEL = "customer_clusters_kmeans"
+
+
+def iter_segmentation_signals(project_id, dataset_id, chunk_size=10000, client=None):
+    """
+    Stream customer_segmentation_signals from BigQuery in DataFrame chunks.
+
+    Args:
+        project_id (str): Google Cloud project ID
+        dataset_id (str): BigQuery dataset ID
+        chunk_size (int): Rows per chunk
+        client (bigquery.Client, optional): Client to run the query with
+
+    Yields:
+        pandas.DataFrame: Up to chunk_size rows of signals
+    """
+    if client is None:
+        client = bigquery.Client(project=project_id)
+    sql = f"SELECT * FROM `{project_id}.{dataset_id}.{SIGNALS_TABLE}`"
+    rows = client.query(sql).result(page_size=chunk_size)
+    yield from rows.to_dataframe_iterable()
+
+
+def read_model_centroids(project_id, dataset_id, model=KMEANS_MODEL, client=None):
+    """
+    Read the centroids of the BigQuery ML k-means model, in the original
+    (not standardised) feature scale.
+
+    Returns:
+        pandas.DataFrame: ML.CENTROIDS rows (centroid_id, feature,
+            numerical_value, categorical_value)
+    """
+    if client is None:
+        client = bigquery.Client(project=project_id)
+    sql = f"SELECT * FROM ML.CENTROIDS(MODEL `{project_id}.{dataset_id}.{model}`)"
+    return client.query(sql).to_dataframe()
+
+
+def read_predicted_customer_ids(project_id, dataset_id, client=None):
+    """
+    Returns:
+        set: IDs of the customers that already have a cluster in
+            customer_clusters_predictions (empty if the table does not exist)
+    """
+    if client is None:
+        client = bigquery.Client(project=project_id)
+    sql = f"SELECT customer_id FROM `{project_id}.{dataset_id}.{PREDICTIONS_TABLE}`"
+    try:
+        return set(client.query(sql).to_dataframe()["customer_id"])
+    except NotFound:
+        return set()
+
+
+def write_cluster_predictions(predictions_df, project_id, dataset_id, append=False, client=None):
+    """
+    Write customer_id / centroid_id rows to customer_clusters_predictions.
+
+    Args:
+        predictions_df (pandas.DataFrame): Output of MiniBatchKMeansSegmenter.predict
+        project_id (str): Google Cloud project ID
+        dataset_id (str): BigQuery dataset ID
+        append (bool): Append (new customers only) instead of replacing the table
+        client (bigquery.Client, optional): Client to load the data with
+
+    Returns:
+        str: Table ID written to
+    """
+    if client is None:
+        client = bigquery.Client(project=project_id)
+    table_id = f"{project_id}.{dataset_id}.{PREDICTIONS_TABLE}"
+    disposition = (
+        bigquery.WriteDisposition.WRITE_APPEND
+        if append
+        else bigquery.WriteDisposition.WRITE_TRUNCATE
+    )
+    job_config = bigquery.LoadJobConfig(write_disposition=disposition)
+    job = client.load_table_from_dataframe(predictions_df, table_id, job_config=job_config)
+    job.result()
+    return table_id
+
+
+class MiniBatchKMeansSegmenter:
+    """
+    Vectorised mini-batch k-means over the customer segmentation signals.
+
+    Features are prepared the same way BigQuery ML k-means does it: numeric and
+    boolean columns are mean-imputed and standardised, string columns are
+    one-hot encoded. ``fit`` computes the feature schema and scaling over all
+    chunks before the first update (``partial_fit`` on a new model only sees
+    its own chunk), and they are saved with the centroids, so a model loaded
+    with ``load`` warm-starts from the previous centroids and keeps its cluster
+    IDs stable (the ``CLUSTER_NAMES`` mapping of the UI keeps pointing at the
+    same segment).
+
+    A new model started from ``initial_centroids`` (ML.CENTROIDS of the
+    BigQuery ML model) keeps that model's cluster IDs; without them the
+    centroids are seeded with k-means++ and the IDs are arbitrary.
+
+    Cluster IDs are returned as ``centroid_id`` starting at 1, like ML.PREDICT.
+    """
+
+    def __init__(
+        self,
+        num_clusters=8,
+        batch_size=1024,
+        id_column="customer_id",
+        seed=42,
+        initial_centroids=None,
+    ):
+        """
+        Args:
+            num_clusters (int): Number of clusters, taken from
+                initial_centroids when given
+            batch_size (int): Rows per mini-batch update
+            id_column (str): Column that identifies a customer (not a feature)
+            seed (int): Random seed for the initial centroids and batch order
+            initial_centroids (pandas.DataFrame, optional): Output of
+                read_model_centroids to start from
+        """
+        if initial_centroids is not None:
+            num_clusters = int(initial_centroids["centroid_id"].nunique())
+        self.num_clusters = num_clusters
+        self.initial_centroids = initial_centroids
+        self.batch_size = batch_size
+        self.id_column = id_column
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        self.numeric_columns = None
+        self.categories = None
+        self.means = None
+        self.stds = None
+        self.centroids = None
+        self.counts = None
+
+    def fit_schema(self, chunks):
+        """
+        Compute the feature columns, categories and scaling over all chunks.
+
+        Args:
+            chunks: Iterable of signal DataFrames
+        """
+        total = count = sum_squares = None
+        categories = {}
+        for df in chunks:
+            features = df.drop(columns=[self.id_column], errors="ignore")
+            if self.numeric_columns is None:
+                self.numeric_columns = [
+                    c
+                    for c in features.columns
+                    if pd.api.types.is_numeric_dtype(features[c])
+                    or pd.api.types.is_bool_dtype(features[c])
+                ]
+                total = np.zeros(len(self.numeric_columns))
+                count = np.zeros(len(self.numeric_columns))
+                sum_squares = np.zeros(len(self.numeric_columns))
+            for c in features.columns:
+                if c not in self.numeric_columns:
+                    categories.setdefault(c, set()).update(
+                        features[c].dropna().astype(str).unique().tolist()
+                    )
+            numeric = self._numeric_matrix(features)
+            total += np.nansum(numeric, axis=0)
+            count += (~np.isnan(numeric)).sum(axis=0)
+            sum_squares += np.nansum(numeric**2, axis=0)
+
+        if self.numeric_columns is None:
+            raise ValueError("No signals to fit the feature schema on")
+        self.categories = {c: sorted(values) for c, values in categories.items()}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = total / count
+            variances = sum_squares / count - means**2
+        self.means = np.nan_to_num(means)
+        stds = np.sqrt(np.clip(np.nan_to_num(variances), 0, None))
+        self.stds = np.where(stds == 0, 1.0, stds)
+
+    def _numeric_matrix(self, df):
+        # Nullable BigQuery dtypes (Int64, boolean) turn their NAs into NaN here
+        return np.column_stack(
+            [
+                df[c].astype("Float64").to_numpy(dtype=np.float64, na_value=np.nan)
+                for c in self.numeric_columns
+            ]
+        ).reshape(len(df), len(self.numeric_columns))
+
+    def transform(self, df):
+        """
+        Turn a signals DataFrame into the standardised feature matrix.
+
+        Returns:
+            numpy.ndarray: float32 array of shape (len(df), num_features)
+        """
+        if self.numeric_columns is None:
+            self.fit_schema([df])
+
+        numeric = self._numeric_matrix(df)
+        numeric = np.where(np.isnan(numeric), self.means, numeric)
+        parts = [(numeric - self.means) / self.stds]
+        for column, values in self.categories.items():
+            codes = pd.Categorical(df[column].astype("string"), categories=values).codes
+            one_hot = np.zeros((len(df), len(values)))
+            rows = np.flatnonzero(codes >= 0)
+            one_hot[rows, codes[rows]] = 1.0
+            parts.append(one_hot)
+        return np.hstack(parts).astype(np.float32)
+
+    def _init_centroids(self, x):
+        # k-means++ seeding on the first chunk
+        centroids = [x[self.rng.integers(len(x))]]
+        closest = ((x - centroids[0]) ** 2).sum(axis=1)
+        for _ in range(1, self.num_clusters):
+            total = closest.sum()
+            if total == 0:
+                idx = self.rng.integers(len(x))
+            else:
+                idx = self.rng.choice(len(x), p=closest / total)
+            centroids.append(x[idx])
+            closest = np.minimum(closest, ((x - x[idx]) ** 2).sum(axis=1))
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.counts = np.zeros(self.num_clusters, dtype=np.float64)
+
+    def _init_from_model(self, centroids_df):
+        # Same feature layout as transform: standardised numerics, then one-hots
+        feature_index = {c: i for i, c in enumerate(self.numeric_columns)}
+        offset = len(self.numeric_columns)
+        for column, values in self.categories.items():
+            for i, value in enumerate(values):
+                feature_index[(column, value)] = offset + i
+            offset += len(values)
+
+        ids = sorted(centroids_df["centroid_id"].unique())
+        centroids = np.zeros((len(ids), offset), dtype=np.float32)
+        for row in centroids_df.itertuples(index=False):
+            k = ids.index(row.centroid_id)
+            if row.feature in self.numeric_columns:
+                value = row.numerical_value
+                if value is None or pd.isna(value):
+                    # BigQuery ML one-hot encodes BOOL features
+                    value = sum(
+                        c["value"]
+                        for c in row.categorical_value
+                        if str(c["category"]).lower() == "true"
+                    )
+                i = feature_index[row.feature]
+                centroids[k, i] = (value - self.means[i]) / self.stds[i]
+            else:
+                for c in row.categorical_value:
+                    i = feature_index.get((row.feature, str(c["category"])))
+                    if i is not None:
+                        centroids[k, i] = c["value"]
+        self.centroids = centroids
+        self.counts = np.zeros(self.num_clusters, dtype=np.float64)
+
+    def _assign(self, x):
+        distances = (
+            (x**2).sum(axis=1, keepdims=True)
+            - 2.0 * x @ self.centroids.T
+            + (self.centroids**2).sum(axis=1)
+        )
+        return distances.argmin(axis=1)
+
+    def partial_fit(self, df):
+        """Update the centroids with one chunk of signals, in mini-batches."""
+        x = self.transform(df)
+        if self.centroids is None:
+            if self.initial_centroids is not None:
+                self._init_from_model(self.initial_centroids)
+            else:
+                self._init_centroids(x)
+
+        order = self.rng.permutation(len(x))
+        for start in range(0, len(x), self.batch_size):
+            batch = x[order[start : start + self.batch_size]]
+            labels = self._assign(batch)
+            one_hot = (labels[:, None] == np.arange(self.num_clusters)).astype(np.float32)
+            batch_counts = one_hot.sum(axis=0)
+            sums = one_hot.T @ batch
+
+            hit = batch_counts > 0
+            self.counts[hit] += batch_counts[hit]
+            rate = (batch_counts[hit] / self.counts[hit])[:, None]
+            means = sums[hit] / batch_counts[hit][:, None]
+            self.centroids[hit] += (rate * (means - self.centroids[hit])).astype(np.float32)
+        return self
+
+    def fit(self, chunks, epochs=1):
+        """
+        Fit (or keep fitting, when warm-started) on an iterable of DataFrames.
+
+        Args:
+            chunks: Iterable of signal DataFrames, or a callable returning a
+                fresh iterable (required for more than one epoch)
+            epochs (int): Number of passes over the chunks
+
+        Returns:
+            MiniBatchKMeansSegmenter: self
+        """
+        if self.numeric_columns is None:
+            if not callable(chunks):
+                chunks = list(chunks)
+            self.fit_schema(chunks() if callable(chunks) else chunks)
+        for _ in range(epochs):
+            for chunk in chunks() if callable(chunks) else chunks:
+                self.partial_fit(chunk)
+        return self
+
+    def predict(self, df):
+        """
+        Returns:
+            pandas.DataFrame: id column and centroid_id (1-based)
+        """
+        labels = self._assign(self.transform(df))
+        return pd.DataFrame(
+            {self.id_column: df[self.id_column].to_numpy(), "centroid_id": labels + 1}
+        )
+
+    def assign_new_customers(self, df, known_ids):
+        """
+        Assign only the customers that do not have a cluster yet.
+
+        Args:
+            df (pandas.DataFrame): Signals of all (or recent) customers
+            known_ids (iterable): IDs already present in the predictions
+
+        Returns:
+            pandas.DataFrame: Predictions for the new customers
+        """
+        new = df[~df[self.id_column].isin(set(known_ids))]
+        return self.predict(new)
+
+    def save(self, path):
+        """Save centroids, counts and the feature schema to an ``.npz`` file."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        schema = {
+            "num_clusters": self.num_clusters,
+            "batch_size": self.batch_size,
+            "id_column": self.id_column,
+            "seed": self.seed,
+            "numeric_columns": self.numeric_columns,
+            "categories": self.categories,
+        }
+        np.savez(
+            path,
+            centroids=self.centroids,
+            counts=self.counts,
+            means=self.means,
+            stds=self.stds,
+            schema=json.dumps(schema),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved model; further fitting warm-starts from its centroids."""
+        with np.load(path) as data:
+            schema = json.loads(str(data["schema"]))
+            segmenter = cls(
+                num_clusters=schema["num_clusters"],
+                batch_size=schema["batch_size"],
+                id_column=schema["id_column"],
+                seed=schema["seed"],
+            )
+            segmenter.numeric_columns = schema["numeric_columns"]
+            segmenter.categories = schema["categories"]
+            segmenter.means = data["means"]
+            segmenter.stds = data["stds"]
+            segmenter.centroids = data["centroids"].copy()
+            segmenter.counts = data["counts"].copy()
+        return segmenter
+
+    @classmethod
+    def load_or_create(cls, path, initial_centroids=None, **kwargs):
+        """
+        Warm-start from ``path`` when it exists, otherwise start a new model.
+
+        Args:
+            path (str): Saved model
+            initial_centroids (pandas.DataFrame or callable, optional):
+                Centroids for a new model, or a callable returning them (only
+                called when there is no saved model)
+        """
+        if os.path.exists(path):
+            return cls.load(path)
+        if callable(initial_centroids):
+            initial_centroids = initial_centroids()
+        return cls(initial_centroids=initial_centroids, **kwargs)
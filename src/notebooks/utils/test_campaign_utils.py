@@ -0,0 +1,201 @@
+import base64
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import campaign_utils
+from campaign_utils import (
+    IMAGE_MODEL,
+    TEXT_MODEL,
+    AssetCache,
+    CampaignEngine,
+    RateLimiter,
+    encode_image_base64,
+)
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256))
+NO_RATE_LIMITS = {TEXT_MODEL: 60000, IMAGE_MODEL: 60000}
+
+
+class FakeBackend:
+    """Offline model backend that counts its calls."""
+
+    def __init__(self, delay=0.0, failures=None):
+        self.delay = delay
+        self.failures = dict(failures or {})
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, method, prompt):
+        with self._lock:
+            self.calls[method] += 1
+            if self.failures.get(prompt):
+                self.failures[prompt] -= 1
+                raise RuntimeError("Vertex AI request failed -> Status: 429")
+        time.sleep(self.delay)
+
+    def generate_text(self, model, prompt, response_schema=None):
+        self._call("generate_text", prompt)
+        return f"text for {prompt}"
+
+    def generate_image(self, model, prompt, person_generation="dont_allow"):
+        self._call("generate_image", prompt)
+        return PNG_BYTES + prompt.encode("utf-8")
+
+    def verify_image(self, model, prompt, image_base64, response_schema=None, temperature=1):
+        self._call("verify_image", prompt)
+        return '{"verified": true}'
+
+
+def process(engine, customer):
+    if customer.get("fail"):
+        raise ValueError("bad customer")
+    text = engine.generate_text(f"email for segment {customer['segment']}")
+    image_path = engine.generate_image(f"image for segment {customer['segment']}")
+    verification = engine.verify_image("verify the image", image_path)
+    return {
+        "customer_id": customer["customer_id"],
+        "text": text,
+        "image": image_path,
+        "verification": verification,
+    }
+
+
+@pytest.fixture
+def customers():
+    return [{"customer_id": i, "segment": i % 2} for i in range(20)]
+
+
+def test_encode_image_base64_matches_file_bytes(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(PNG_BYTES)
+
+    expected = base64.b64encode(PNG_BYTES).decode("utf-8")
+    assert encode_image_base64(str(path)) == expected
+    assert encode_image_base64(PNG_BYTES) == expected
+
+
+def test_identical_requests_are_generated_once(tmp_path, customers):
+    backend = FakeBackend(delay=0.05)
+    engine = CampaignEngine(
+        backend, AssetCache(str(tmp_path)), max_workers=8, rate_limits=NO_RATE_LIMITS
+    )
+
+    results = engine.run(customers, process)
+
+    # Two segments: concurrent requests for the same asset wait for one call
+    assert backend.calls == {"generate_text": 2, "generate_image": 2, "verify_image": 2}
+    assert [r["customer_id"] for r in results] == list(range(20))
+    assert results[1]["text"] == "text for email for segment 1"
+    with open(results[0]["image"], "rb") as f:
+        assert f.read() == PNG_BYTES + b"image for segment 0"
+
+    # A re-run, even with a new engine, is served from the cache
+    CampaignEngine(backend, AssetCache(str(tmp_path)), rate_limits=NO_RATE_LIMITS).run(
+        customers, process
+    )
+    assert sum(backend.calls.values()) == 6
+
+
+class FakeClock:
+    """Monotonic clock that only moves when something sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(
+        campaign_utils, "time", SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep)
+    )
+    return clock
+
+
+def test_rate_limiter_allows_a_burst_then_spaces_calls(clock):
+    # 240 per minute: a burst of 4, then one call every 250ms
+    limiter = RateLimiter(240)
+
+    times = []
+    for _ in range(8):
+        limiter.acquire()
+        times.append(clock.now)
+
+    assert times == [0, 0, 0, 0, 0.25, 0.5, 0.75, 1]
+
+
+def test_rate_limiter_refills_while_idle(clock):
+    limiter = RateLimiter(60)
+    limiter.acquire()
+
+    clock.now += 10
+    limiter.acquire()
+    assert clock.now == 10
+    # The bucket holds a single token, however long it was idle
+    limiter.acquire()
+    assert clock.now == 11
+
+
+def test_engine_calls_are_rate_limited(tmp_path):
+    backend = FakeBackend()
+    engine = CampaignEngine(
+        backend,
+        AssetCache(str(tmp_path)),
+        max_workers=8,
+        rate_limits={TEXT_MODEL: 1200, IMAGE_MODEL: 1200},
+    )
+    customers = [{"customer_id": i} for i in range(40)]
+
+    started = time.monotonic()
+    engine.run(customers, lambda engine, c: engine.generate_text(f"prompt {c['customer_id']}"))
+    elapsed = time.monotonic() - started
+
+    assert backend.calls["generate_text"] == 40
+    # A burst of 20, then 20 calls 50ms apart
+    assert elapsed >= 0.9
+
+
+def test_retries_take_a_rate_limiter_token(tmp_path):
+    backend = FakeBackend(failures={"prompt": 1})
+    engine = CampaignEngine(backend, AssetCache(str(tmp_path)), rate_limits={TEXT_MODEL: 60})
+    limiter = engine.rate_limiters[TEXT_MODEL]
+    acquired = []
+    acquire = limiter.acquire
+    limiter.acquire = lambda: acquired.append(1) or acquire()
+
+    assert engine.generate_text("prompt") == "text for prompt"
+    assert backend.calls["generate_text"] == 2
+    assert len(acquired) == 2
+
+
+def test_run_captures_errors_per_customer(tmp_path, customers):
+    customers[3]["fail"] = True
+    engine = CampaignEngine(
+        FakeBackend(), AssetCache(str(tmp_path)), rate_limits=NO_RATE_LIMITS
+    )
+
+    results = engine.run(customers, process)
+
+    assert results[3] == {"customer_id": 3, "error": "bad customer"}
+    assert all("error" not in r for i, r in enumerate(results) if i != 3)
+
+
+def test_owner_checks_the_cache_again(tmp_path):
+    engine = CampaignEngine(FakeBackend(), AssetCache(str(tmp_path)))
+    # Stored by a previous owner between the first lookup and taking ownership
+    lookups = iter([None, "stored"])
+
+    value = engine._once("key", lambda key: next(lookups), lambda: pytest.fail("produced"))
+
+    assert value == "stored"
+    assert engine._in_flight == {}
@@ -0,0 +1,84 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from data_utils import _warehouse_query, iter_table_batches, read_table
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    table = pa.table(
+        {
+            "customer_id": ["a", "b", "c", "d"],
+            "age": pa.array([20, None, 40, 50], pa.int64()),
+            "premium_amount": pa.array([100.5, None, 300.25, 400.0], pa.float64()),
+        }
+    )
+    pq.write_table(table, tmp_path / "customers.parquet", row_group_size=2)
+    return str(tmp_path)
+
+
+def test_read_table_projection_and_filters(data_dir):
+    df = read_table(
+        "customers", columns=["customer_id", "age"], filters=[("age", ">=", 40)], data_dir=data_dir
+    )
+
+    assert df.columns.tolist() == ["customer_id", "age"]
+    assert df["customer_id"].tolist() == ["c", "d"]
+    assert isinstance(df["age"].dtype, pd.ArrowDtype)
+
+
+def test_read_table_numpy_backend_uses_nan(data_dir):
+    df = read_table("customers", data_dir=data_dir, dtype_backend="numpy")
+
+    assert df["premium_amount"].dtype == np.float64
+    assert np.isnan(round(df.loc[1, "premium_amount"], 2))
+    assert np.isnan(df.loc[1, "age"])
+
+    batches = list(iter_table_batches("customers", data_dir=data_dir, dtype_backend="numpy"))
+    assert [b["premium_amount"].dtype for b in batches] == [np.float64, np.float64]
+
+
+def test_read_table_rejects_unknown_modes(data_dir):
+    with pytest.raises(ValueError, match="warehouse"):
+        read_table("customers", data_dir=data_dir, warehouse="sometimes")
+    with pytest.raises(ValueError, match="dtype_backend"):
+        read_table("customers", data_dir=data_dir, dtype_backend="arrow")
+    with pytest.raises(FileNotFoundError):
+        read_table("missing", data_dir=data_dir)
+
+
+def test_warehouse_query_parameters_from_numpy_scalars():
+    sql, parameters = _warehouse_query(
+        "customers",
+        "project",
+        "dataset",
+        ["customer_id"],
+        [
+            ("age", ">=", np.int64(40)),
+            ("premium_amount", "<", np.float64(500.0)),
+            ("is_engaged", "=", np.bool_(True)),
+            ("customer_id", "in", np.array(["a", "b"])),
+            ("registration_date", ">", np.datetime64("2024-01-01T00:00:00")),
+        ],
+    )
+
+    assert sql == (
+        "SELECT `customer_id` FROM `project.dataset.customers` WHERE `age` >=(@p0) "
+        "AND `premium_amount` <(@p1) AND `is_engaged` =(@p2) "
+        "AND `customer_id` IN UNNEST(@p3) AND `registration_date` >(@p4)"
+    )
+    assert [(p.type_, p.value) for p in parameters[:3]] == [
+        ("INT64", 40),
+        ("FLOAT64", 500.0),
+        ("BOOL", True),
+    ]
+    assert (parameters[3].array_type, parameters[3].values) == ("STRING", ["a", "b"])
+    assert (parameters[4].type_, parameters[4].value) == (
+        "TIMESTAMP",
+        datetime.datetime(2024, 1, 1),
+    )
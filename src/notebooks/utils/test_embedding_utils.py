@@ -0,0 +1,109 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from embedding_utils import EMBEDDING_DIMENSIONALITY, LocalEmbeddingStore, content_hash
+
+
+class FakeEmbedder:
+    """Deterministic embed_fn that records the texts it was asked to embed."""
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, texts):
+        self.texts.extend(texts)
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+            vectors.append(np.random.default_rng(seed).normal(size=EMBEDDING_DIMENSIONALITY))
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def descriptions(**texts):
+    return pd.DataFrame(
+        {"customer_id": list(texts), "customer_description": list(texts.values())}
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalEmbeddingStore(str(tmp_path / "embeddings"))
+
+
+def test_content_hash_matches_bigquery_sha256():
+    # TO_HEX(SHA256("abc")) in BigQuery
+    assert content_hash("abc") == (
+        "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+    )
+
+
+def test_refresh_with_unchanged_data_embeds_nothing(store):
+    embed = FakeEmbedder()
+    df = descriptions(a="likes cars", b="likes boats", c="likes planes")
+
+    assert store.refresh(df, embed, batch_size=2) == {"embedded": 3, "kept": 0, "deleted": 0}
+    embed.texts.clear()
+
+    assert store.refresh(df, embed) == {"embedded": 0, "kept": 3, "deleted": 0}
+    assert embed.texts == []
+
+
+def test_refresh_re_embeds_only_changed_descriptions(store):
+    embed = FakeEmbedder()
+    store.refresh(descriptions(a="likes cars", b="likes boats"), embed)
+    embed.texts.clear()
+
+    counts = store.refresh(descriptions(a="likes cars", b="likes trains", c="new"), embed)
+
+    assert counts == {"embedded": 2, "kept": 1, "deleted": 0}
+    assert embed.texts == ["likes trains", "new"]
+    index, vectors = store.load()
+    by_id = dict(zip(index["customer_id"], vectors))
+    expected = FakeEmbedder()(["likes trains"])[0]
+    np.testing.assert_allclose(by_id["b"], expected / np.linalg.norm(expected), rtol=1e-6)
+
+
+def test_refresh_deletes_removed_and_null_descriptions(store):
+    embed = FakeEmbedder()
+    store.refresh(descriptions(a="likes cars", b="likes boats", c="likes planes"), embed)
+
+    df = descriptions(a="likes cars", c=None)
+    counts = store.refresh(df, embed)
+
+    assert counts == {"embedded": 0, "kept": 1, "deleted": 2}
+    index, vectors = store.load()
+    assert index["customer_id"].tolist() == ["a"]
+    assert vectors.shape == (1, EMBEDDING_DIMENSIONALITY)
+
+
+def test_search_ranks_by_cosine_similarity(store):
+    embed = FakeEmbedder()
+    store.refresh(descriptions(a="likes cars", b="likes boats", c="likes planes"), embed)
+    boats = embed(["likes boats"])[0]
+    planes = embed(["likes planes"])[0]
+
+    # Mostly boats, a bit of planes; scaling the query must not matter
+    results = store.search(10 * (0.9 * boats + 0.1 * planes), top_k=2)
+
+    assert results["customer_id"].tolist() == ["b", "c"]
+    assert results["distance"].is_monotonic_increasing
+    assert results["distance"].iloc[0] < 0.1
+
+
+def test_load_rejects_misaligned_files(store):
+    embed = FakeEmbedder()
+    store.refresh(descriptions(a="likes cars", b="likes boats"), embed)
+    # An index written without its vectors, e.g. an interrupted refresh
+    pd.DataFrame({"customer_id": ["a"], "content_hash": [content_hash("likes cars")]}).to_parquet(
+        store.index_path, index=False
+    )
+
+    with pytest.raises(ValueError, match="inconsistent"):
+        store.load()
+
+    embed.texts.clear()
+    assert store.refresh(descriptions(a="likes cars"), embed)["embedded"] == 1
+    assert len(store.load()[0]) == 1
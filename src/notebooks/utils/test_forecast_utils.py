@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast_utils
+from forecast_utils import (
+    RevenueForecaster,
+    SeasonalNaiveBackend,
+    TimesFmBackend,
+    build_revenue_series,
+    timesfm_freq,
+)
+
+
+class FakeTimesFm:
+    """Stands in for a loaded timesfm.TimesFm: forecasts the last value."""
+
+    per_core_batch_size = 4
+    horizon_len = 16
+    global_batch_size = 4
+
+    def __init__(self):
+        self.freqs = []
+
+    def forecast(self, inputs, freq):
+        self.freqs.extend(freq)
+        point = np.array([np.full(self.horizon_len, values[-1]) for values in inputs])
+        return point, None
+
+
+@pytest.fixture
+def revenue_df():
+    dates = pd.date_range("2024-01-01", periods=28, freq="D")
+    return pd.DataFrame(
+        {
+            "date": np.tile(dates.strftime("%Y-%m-%d"), 2),
+            "product": ["Auto"] * 28 + ["Home"] * 28,
+            "category": "Premium",
+            "revenue": np.concatenate([np.arange(28) % 7 + 1.0, np.full(28, 10.0)]),
+        }
+    )
+
+
+def test_build_revenue_series_fills_missing_days(revenue_df):
+    series = build_revenue_series(revenue_df.drop(index=[3, 4]))
+
+    assert series.groupby("unique_id").size().tolist() == [28, 28]
+    auto = series[series["unique_id"] == "Auto | Premium"]
+    assert auto["y"].iloc[3:5].tolist() == [0.0, 0.0]
+
+
+def test_seasonal_naive_repeats_last_season():
+    backend = SeasonalNaiveBackend(season_length=3)
+
+    forecast = backend.forecast([np.arange(10.0), np.array([])], horizon=5)
+
+    np.testing.assert_array_equal(forecast[0], [7, 8, 9, 7, 8])
+    np.testing.assert_array_equal(forecast[1], np.zeros(5))
+
+
+def test_forecaster_batches_all_series(revenue_df):
+    series = build_revenue_series(revenue_df)
+    forecaster = RevenueForecaster(SeasonalNaiveBackend(batch_size=1), cache_dir=None)
+
+    forecast = forecaster.forecast(series, horizon=7)
+
+    assert len(forecast) == 14
+    auto = forecast[forecast["unique_id"] == "Auto | Premium"]
+    assert auto["ds"].iloc[0] == pd.Timestamp("2024-01-29")
+    assert auto["forecast"].tolist() == [1, 2, 3, 4, 5, 6, 7]
+    assert (forecast.loc[forecast["unique_id"] == "Home | Premium", "forecast"] == 10).all()
+
+
+def test_forecast_cache_depends_on_backend_settings(revenue_df, tmp_path):
+    series = build_revenue_series(revenue_df)
+
+    weekly = RevenueForecaster(SeasonalNaiveBackend(season_length=7), cache_dir=tmp_path)
+    daily = RevenueForecaster(SeasonalNaiveBackend(season_length=1), cache_dir=tmp_path)
+    weekly_forecast = weekly.forecast(series, horizon=7)
+    daily_forecast = daily.forecast(series, horizon=7)
+
+    assert len(list(tmp_path.iterdir())) == 2
+    auto = daily_forecast["unique_id"] == "Auto | Premium"
+    assert (daily_forecast.loc[auto, "forecast"] == 7).all()
+    pd.testing.assert_frame_equal(weekly.forecast(series, horizon=7), weekly_forecast)
+
+
+@pytest.mark.parametrize(
+    "freq, category",
+    [("h", 0), ("D", 0), ("B", 0), ("W", 1), ("MS", 1), ("ME", 1), ("QE", 2), ("YS", 2)],
+)
+def test_timesfm_freq(freq, category):
+    assert timesfm_freq(freq) == category
+
+
+def test_timesfm_backend_reuses_a_loaded_model(revenue_df, monkeypatch):
+    monkeypatch.setattr(forecast_utils, "_TIMESFM_MODELS", {})
+    tfm = FakeTimesFm()
+    backend = TimesFmBackend(model=tfm)
+
+    assert (backend.per_core_batch_size, backend.horizon_len) == (4, 16)
+    # Any backend with the same settings shares the model instead of loading it
+    assert TimesFmBackend(per_core_batch_size=4, horizon_len=16).model is tfm
+
+    series = build_revenue_series(revenue_df, freq="W")
+    forecast = RevenueForecaster(backend, cache_dir=None).forecast(series, horizon=3, freq="W")
+
+    assert len(forecast) == 6
+    assert set(tfm.freqs) == {1}
+    with pytest.raises(ValueError, match="horizon_len"):
+        backend.forecast([np.ones(3)], horizon=17)
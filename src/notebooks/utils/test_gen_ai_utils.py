@@ -0,0 +1,199 @@
+import copy
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import gen_ai_utils
+from gen_ai_utils import (
+    TEXT_EMBEDDING_MODEL_NAME,
+    VERTEX_AI_USER_ROLE,
+    ApiRequestError,
+    TextEmbeddingProvisioner,
+    add_iam_bindings,
+    update_project_iam_policy,
+)
+
+
+class FakeGoogleCloud:
+    """In-memory BigQuery connections, project IAM policies and models."""
+
+    def __init__(self):
+        self.connections = {}
+        self.policies = {}
+        self.models = set()
+        self.calls = []
+        # Called before a setIamPolicy is applied, e.g. to simulate another writer
+        self.before_set_policy = None
+
+    def policy(self, project_id):
+        return self.policies.setdefault(
+            project_id, {"version": 1, "etag": "etag-0", "bindings": []}
+        )
+
+    def make_api_request(self, url, method, data=None, headers=None):
+        path = url.split("/v1/", 1)[1]
+        self.calls.append((method, path.split("?")[0].rsplit(":", 1)[-1]))
+        if path.endswith(":getIamPolicy"):
+            assert data == {"options": {"requestedPolicyVersion": 3}}
+            return copy.deepcopy(self.policy(path.split("/")[1].split(":")[0]))
+        if path.endswith(":setIamPolicy"):
+            project_id = path.split("/")[1].split(":")[0]
+            if self.before_set_policy:
+                self.before_set_policy, callback = None, self.before_set_policy
+                callback(self.policy(project_id))
+            current = self.policy(project_id)
+            policy = data["policy"]
+            if policy["etag"] != current["etag"]:
+                raise ApiRequestError("etag mismatch", 409)
+            assert policy["version"] == 3
+            revision = int(current["etag"].split("-")[1]) + 1
+            self.policies[project_id] = dict(copy.deepcopy(policy), etag=f"etag-{revision}")
+            return self.policies[project_id]
+        if path.endswith("/connections") and method == "GET":
+            location = path.split("/")[3]
+            return {
+                "connections": [
+                    {"name": f"{path}/{name}", "cloudResource": {"serviceAccountId": sa}}
+                    for (loc, name), sa in self.connections.items()
+                    if loc == location
+                ]
+            }
+        if "/connections?connectionId=" in path and method == "POST":
+            location = path.split("/")[3]
+            name = path.split("connectionId=")[1]
+            self.connections[(location, name)] = f"{name}@connections.iam"
+            return {"cloudResource": {"serviceAccountId": self.connections[(location, name)]}}
+        raise AssertionError(f"Unexpected request: {method} {url}")
+
+    def bigquery_client(self, project=None):
+        client = mock.Mock()
+
+        def list_models(dataset):
+            return [
+                SimpleNamespace(model_id=model_id)
+                for ds, model_id in self.models
+                if ds == dataset
+            ]
+
+        def query_and_wait(sql):
+            model = sql.split("`")[1]
+            dataset, model_id = model.rsplit(".", 1)
+            self.models.add((dataset, model_id))
+
+        client.list_models.side_effect = list_models
+        client.query_and_wait.side_effect = query_and_wait
+        return client
+
+
+@pytest.fixture
+def cloud():
+    cloud = FakeGoogleCloud()
+    with mock.patch.object(
+        gen_ai_utils, "make_api_request", side_effect=cloud.make_api_request
+    ), mock.patch.object(
+        gen_ai_utils, "get_auth_headers", return_value={}
+    ), mock.patch.object(
+        gen_ai_utils.bigquery, "Client", side_effect=cloud.bigquery_client
+    ), mock.patch.object(
+        gen_ai_utils.time, "sleep"
+    ) as sleep:
+        cloud.sleep = sleep
+        yield cloud
+
+
+def params(dataset_id, project_id="project"):
+    return {
+        "project_id": project_id,
+        "bigquery_location": "US",
+        "dataset_id": dataset_id,
+        "vertex_ai_connection_name": "vertex_connection",
+    }
+
+
+def test_add_iam_bindings_skips_conditional_bindings():
+    conditional = {
+        "role": VERTEX_AI_USER_ROLE,
+        "members": ["user:a"],
+        "condition": {"title": "weekdays", "expression": "request.time.getDayOfWeek() < 5"},
+    }
+    policy = {"bindings": [copy.deepcopy(conditional)]}
+
+    added = add_iam_bindings(policy, {VERTEX_AI_USER_ROLE: ["user:a", "user:b"]})
+
+    assert added == [("user:a", VERTEX_AI_USER_ROLE), ("user:b", VERTEX_AI_USER_ROLE)]
+    assert policy["bindings"][0] == conditional
+    assert policy["bindings"][1] == {"role": VERTEX_AI_USER_ROLE, "members": ["user:a", "user:b"]}
+
+
+def test_conflict_rereads_policy_and_keeps_concurrent_bindings(cloud):
+    def concurrent_writer(policy):
+        policy["bindings"].append({"role": "roles/viewer", "members": ["user:other"]})
+        policy["etag"] = "etag-5"
+
+    cloud.before_set_policy = concurrent_writer
+
+    added = update_project_iam_policy("project", {VERTEX_AI_USER_ROLE: ["serviceAccount:sa"]})
+
+    assert added == [("serviceAccount:sa", VERTEX_AI_USER_ROLE)]
+    assert cloud.calls == [
+        ("POST", "getIamPolicy"),
+        ("POST", "setIamPolicy"),
+        ("POST", "getIamPolicy"),
+        ("POST", "setIamPolicy"),
+    ]
+    assert cloud.policies["project"]["bindings"] == [
+        {"role": "roles/viewer", "members": ["user:other"]},
+        {"role": VERTEX_AI_USER_ROLE, "members": ["serviceAccount:sa"]},
+    ]
+    assert cloud.policies["project"]["version"] == 3
+
+
+def test_failed_grant_is_retried_by_the_next_provision(cloud):
+    def server_error(policy):
+        raise ApiRequestError("server error", 500)
+
+    provisioner = TextEmbeddingProvisioner()
+    cloud.before_set_policy = server_error
+
+    with pytest.raises(ApiRequestError):
+        provisioner.provision([params("dataset")])
+    result = provisioner.provision([params("dataset")])
+
+    assert result["bindings_added"] == [
+        ("serviceAccount:vertex_connection@connections.iam", VERTEX_AI_USER_ROLE)
+    ]
+    assert cloud.policies["project"]["bindings"][0]["members"] == [
+        "serviceAccount:vertex_connection@connections.iam"
+    ]
+
+
+def test_provision_is_idempotent(cloud):
+    first = TextEmbeddingProvisioner().provision([params("dataset")])
+
+    assert first["connections_created"] == [("project", "US", "vertex_connection")]
+    assert first["models_created"] == [("project", "dataset")]
+    assert ("project.dataset", TEXT_EMBEDDING_MODEL_NAME) in cloud.models
+    cloud.sleep.assert_called_once_with(gen_ai_utils.IAM_PROPAGATION_SECONDS)
+
+    cloud.calls.clear()
+    cloud.sleep.reset_mock()
+    second = TextEmbeddingProvisioner().provision([params("dataset")])
+
+    assert second == {"connections_created": [], "bindings_added": [], "models_created": []}
+    assert ("POST", "setIamPolicy") not in cloud.calls
+    cloud.sleep.assert_not_called()
+
+
+def test_datasets_of_one_project_share_one_policy_write(cloud):
+    result = TextEmbeddingProvisioner().provision(
+        [params("dataset_a"), params("dataset_b"), params("dataset_c", project_id="other")]
+    )
+
+    assert cloud.calls.count(("POST", "setIamPolicy")) == 2
+    assert cloud.calls.count(("POST", "getIamPolicy")) == 2
+    assert result["models_created"] == [
+        ("other", "dataset_c"),
+        ("project", "dataset_a"),
+        ("project", "dataset_b"),
+    ]
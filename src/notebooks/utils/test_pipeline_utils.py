@@ -0,0 +1,154 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from pipeline_utils import SQLiteEngine, SqlPipeline
+
+
+class SlowEngine(SQLiteEngine):
+    """SQLiteEngine whose statements take a while, recording the overlap."""
+
+    def __init__(self, delay=0.2):
+        super().__init__()
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self._count_lock = threading.Lock()
+
+    def execute(self, sql, target=None):
+        with self._count_lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self._count_lock:
+            self.running -= 1
+        super().execute(sql, target)
+
+
+def build_pipeline(engine):
+    engine.load_table("customers", pd.DataFrame({"customer_id": [1, 2, 3], "age": [20, 40, 60]}))
+    engine.load_table("policies", pd.DataFrame({"customer_id": [1, 2, 3], "premium": [1, 2, 3]}))
+    pipeline = SqlPipeline(engine)
+    pipeline.add_node(
+        "young",
+        "DROP TABLE IF EXISTS young; "
+        "CREATE TABLE young AS SELECT customer_id FROM customers WHERE age < 50;",
+        "young",
+        ["customers"],
+    )
+    pipeline.add_node(
+        "premiums",
+        "DROP TABLE IF EXISTS premiums; "
+        "CREATE TABLE premiums AS SELECT customer_id, premium * 10 AS premium FROM policies;",
+        "premiums",
+        ["policies"],
+    )
+    pipeline.add_node(
+        "signals",
+        "DROP TABLE IF EXISTS signals; "
+        "CREATE TABLE signals AS SELECT y.customer_id, p.premium "
+        "FROM young y JOIN premiums p USING (customer_id);",
+        "signals",
+        ["young", "premiums"],
+    )
+    return pipeline
+
+
+def read(engine, table):
+    return pd.read_sql(f"SELECT * FROM {table} ORDER BY customer_id", engine.connection)
+
+
+def test_independent_nodes_run_concurrently():
+    engine = SlowEngine(delay=0.2)
+    pipeline = build_pipeline(engine)
+
+    results = pipeline.run()
+
+    # young and premiums overlap
+    assert engine.max_running == 2
+    assert list(results)[-1] == "signals"
+    assert read(engine, "signals").to_dict("list") == {
+        "customer_id": [1, 2],
+        "premium": [10, 20],
+    }
+
+
+def test_unchanged_inputs_are_skipped():
+    engine = SQLiteEngine()
+    pipeline = build_pipeline(engine)
+    pipeline.run()
+
+    results = pipeline.run()
+
+    assert {name: r["status"] for name, r in results.items()} == {
+        "young": "skipped",
+        "premiums": "skipped",
+        "signals": "skipped",
+    }
+    assert all(r["status"] == "ran" for r in pipeline.run(force=True).values())
+
+
+def test_changed_input_reruns_downstream_nodes():
+    engine = SQLiteEngine()
+    pipeline = build_pipeline(engine)
+    pipeline.run()
+
+    engine.load_table("customers", pd.DataFrame({"customer_id": [1, 2, 3], "age": [20, 40, 45]}))
+    results = pipeline.run()
+
+    assert results["young"]["status"] == "ran"
+    assert results["premiums"]["status"] == "skipped"
+    assert results["signals"]["status"] == "ran"
+    assert read(engine, "signals")["customer_id"].tolist() == [1, 2, 3]
+
+
+def test_volatile_node_is_rebuilt_on_a_new_day():
+    engine = SQLiteEngine()
+    pipeline = build_pipeline(engine)
+    pipeline.nodes["young"]["volatile"] = True
+    pipeline.run()
+
+    assert pipeline.run()["young"]["status"] == "skipped"
+
+    yesterday = datetime.now(timezone.utc) - timedelta(days=1)
+    for table in ("customers", "policies", "young", "premiums", "signals"):
+        engine._modified[table] = yesterday
+    results = pipeline.run()
+
+    assert results["young"]["status"] == "ran"
+    assert results["premiums"]["status"] == "skipped"
+    assert results["signals"]["status"] == "ran"
+
+
+def test_failed_node_stops_downstream_and_raises(capsys):
+    engine = SQLiteEngine()
+    pipeline = build_pipeline(engine)
+    pipeline.nodes["young"]["sql"] = "SELECT * FROM missing_table;"
+
+    with pytest.raises(RuntimeError, match="Pipeline node young failed"):
+        pipeline.run()
+
+    output = capsys.readouterr().out
+    assert "young: failed" in output
+    assert "premiums: ran" in output
+    assert "signals: not_run" in output
+    assert engine.last_modified("signals") is None
+
+
+def test_cycle_is_rejected():
+    pipeline = SqlPipeline(SQLiteEngine())
+    pipeline.add_node("a", "SELECT 1;", "a", ["b"])
+    pipeline.add_node("b", "SELECT 1;", "b", ["a"])
+
+    with pytest.raises(ValueError, match="Cycle in pipeline"):
+        pipeline.run()
+
+
+def test_duplicate_node_is_rejected():
+    pipeline = SqlPipeline(SQLiteEngine()).add_node("a", "SELECT 1;", "a")
+
+    with pytest.raises(ValueError, match="Duplicate pipeline node"):
+        pipeline.add_node("a", "SELECT 1;", "a")
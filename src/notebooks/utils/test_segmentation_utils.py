@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from segmentation_utils import MiniBatchKMeansSegmenter
+
+# Three well separated groups of customers: (age, premium, has_garage, coverage_level)
+GROUPS = [
+    (25, 500, False, "Basic"),
+    (45, 1500, True, "Standard"),
+    (70, 3000, True, "Premium"),
+]
+
+
+def signals(num_per_group=100, seed=0, start=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for g, (age, premium, has_garage, coverage) in enumerate(GROUPS):
+        n = num_per_group
+        frames.append(
+            pd.DataFrame(
+                {
+                    "customer_id": [f"c{start + g * n + i}" for i in range(n)],
+                    "age": pd.array(rng.normal(age, 2, n).round(), dtype="Int64"),
+                    "premium_amount": rng.normal(premium, 50, n),
+                    "has_garage": pd.array(np.full(n, has_garage), dtype="boolean"),
+                    "coverage_level": coverage,
+                }
+            )
+        )
+    # Shuffled, so every chunk has customers of every group
+    return pd.concat(frames).sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def chunks(df, size=100):
+    return [df.iloc[i : i + size] for i in range(0, len(df), size)]
+
+
+def group_of(df):
+    return df["coverage_level"].map({g[3]: i for i, g in enumerate(GROUPS)}).to_numpy()
+
+
+def centroid_row(centroid_id, feature, numerical_value=None, categorical_value=()):
+    return {
+        "centroid_id": centroid_id,
+        "feature": feature,
+        "numerical_value": numerical_value,
+        "categorical_value": list(categorical_value),
+    }
+
+
+def model_centroids():
+    """ML.CENTROIDS rows of a BigQuery ML model, in the original feature scale."""
+    rows = []
+    # Deliberately not in group order: the youngest group is centroid 3
+    for centroid_id, (age, premium, has_garage, coverage) in zip([3, 1, 2], GROUPS):
+        rows.append(centroid_row(centroid_id, "age", float(age)))
+        rows.append(centroid_row(centroid_id, "premium_amount", float(premium)))
+        # BigQuery ML one-hot encodes BOOL features
+        rows.append(
+            centroid_row(
+                centroid_id,
+                "has_garage",
+                categorical_value=[
+                    {"category": "true", "value": float(has_garage)},
+                    {"category": "false", "value": float(not has_garage)},
+                ],
+            )
+        )
+        rows.append(
+            centroid_row(
+                centroid_id,
+                "coverage_level",
+                categorical_value=[{"category": coverage, "value": 1.0}],
+            )
+        )
+    return pd.DataFrame(rows)
+
+
+def test_fit_separates_groups_and_scales_on_all_chunks():
+    df = signals()
+    segmenter = MiniBatchKMeansSegmenter(num_clusters=3, batch_size=64)
+
+    segmenter.fit(chunks(df), epochs=2)
+
+    labels = segmenter.predict(df)["centroid_id"].to_numpy()
+    assert set(labels) == {1, 2, 3}
+    # Every group maps to exactly one cluster
+    assert all(len(set(labels[group_of(df) == g])) == 1 for g in range(3))
+    assert segmenter.categories == {"coverage_level": ["Basic", "Premium", "Standard"]}
+    np.testing.assert_allclose(segmenter.means[0], df["age"].astype(float).mean())
+
+
+def test_refit_after_load_keeps_cluster_ids(tmp_path):
+    df = signals()
+    path = str(tmp_path / "model.npz")
+    segmenter = MiniBatchKMeansSegmenter(num_clusters=3).fit(chunks(df))
+    before = segmenter.predict(df)
+    segmenter.save(path)
+
+    loaded = MiniBatchKMeansSegmenter.load_or_create(path, num_clusters=99)
+    pd.testing.assert_frame_equal(loaded.predict(df), before)
+
+    loaded.fit(chunks(signals(seed=1, start=1000)), epochs=2)
+    pd.testing.assert_frame_equal(loaded.predict(df), before)
+
+
+def test_model_centroids_keep_their_ids():
+    df = signals()
+    centroids = model_centroids()
+
+    segmenter = MiniBatchKMeansSegmenter.load_or_create(
+        "missing.npz", initial_centroids=lambda: centroids
+    )
+    segmenter.fit(chunks(df))
+
+    assert segmenter.num_clusters == 3
+    expected = np.array([3, 1, 2])[group_of(df)]
+    np.testing.assert_array_equal(segmenter.predict(df)["centroid_id"], expected)
+
+
+def test_model_centroids_are_mapped_to_the_feature_layout():
+    df = signals()
+    segmenter = MiniBatchKMeansSegmenter(initial_centroids=model_centroids())
+    segmenter.fit_schema(chunks(df))
+
+    segmenter._init_from_model(segmenter.initial_centroids)
+
+    # Features: age, premium_amount, has_garage (standardised), then one-hot
+    # coverage_level in sorted order: Basic, Premium, Standard
+    youngest = segmenter.centroids[2]  # centroid_id 3
+    np.testing.assert_allclose(
+        youngest[:3], (np.array([25, 500, 0]) - segmenter.means) / segmenter.stds, rtol=1e-5
+    )
+    np.testing.assert_array_equal(youngest[3:], [1, 0, 0])
+    oldest = segmenter.centroids[1]  # centroid_id 2
+    np.testing.assert_array_equal(oldest[3:], [0, 1, 0])
+
+
+def test_assign_new_customers_skips_known_ones():
+    df = signals()
+    segmenter = MiniBatchKMeansSegmenter(num_clusters=3).fit(chunks(df))
+    known_ids = set(df["customer_id"].iloc[:250])
+
+    new = segmenter.assign_new_customers(df, known_ids)
+
+    assert new["customer_id"].tolist() == df["customer_id"].iloc[250:].tolist()
+    pd.testing.assert_frame_equal(
+        new.reset_index(drop=True), segmenter.predict(df.iloc[250:]).reset_index(drop=True)
+    )
+    assert segmenter.assign_new_customers(df, df["customer_id"]).empty
+
+
+def test_fit_without_signals_fails():
+    with pytest.raises(ValueError, match="No signals"):
+        MiniBatchKMeansSegmenter().fit([])
@@ -0,0 +1,300 @@
+"""
+Load-test harness for the Smart Segmentation API.
+
+Starts the FastAPI app in-process with fake BigQuery / GenAI clients (so no
+cloud project or credentials are needed), drives the endpoints at fixed
+request rates and concurrency levels, and reports throughput and latency
+percentiles. Use --url to load-test an already running server instead.
+
+    python loadtest.py --rates 20,50 --concurrency 8,32 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+ENDPOINTS = {
+    "customers": "/customers?limit=100",
+    "search": "/customers/search?query=young%20driver%20with%20low%20engagement&top_k=5",
+    "clusters": "/customers/clusters?limit=10",
+    "stats": "/clusters/stats",
+}
+
+
+class FakeQueryJob:
+    def __init__(self, df, latency):
+        self._df = df
+        self._latency = latency
+
+    def to_dataframe(self):
+        # Blocking, like the real client waiting on BigQuery
+        time.sleep(self._latency)
+        return self._df.copy()
+
+
+class FakeBigQueryClient:
+    """
+    Stand-in for bigquery.Client returning synthetic rows shaped like the
+    lab tables after a configurable latency.
+    """
+
+    def __init__(self, latency=0.05, num_rows=100, num_clusters=8, seed=42):
+        """
+        Args:
+            latency (float): Seconds every query takes
+            num_rows (int): Maximum rows returned by customer queries (the
+                query's LIMIT / top_k still applies)
+            num_clusters (int): Number of clusters in cluster queries
+            seed (int): Random seed for the synthetic rows
+        """
+        self.latency = latency
+        self.num_rows = num_rows
+        self.num_clusters = num_clusters
+        self.rng = np.random.default_rng(seed)
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._customers = self._customer_rows(max(num_rows, 1000))
+
+    def _customer_rows(self, n):
+        return pd.DataFrame(
+            {
+                "customer_id": [f"customer-{i}" for i in range(n)],
+                "first_name": "Alex",
+                "age": self.rng.integers(18, 85, n),
+                "gender": self.rng.choice(["Male", "Female"], n),
+                "country": "DE",
+                "registration_date": pd.Timestamp("2024-01-01")
+                + pd.to_timedelta(self.rng.integers(0, 365, n), unit="D"),
+                "policy_id": [f"policy-{i}" for i in range(n)],
+                "premium_amount": self.rng.uniform(500, 3000, n),
+                "years_with_license": self.rng.integers(1, 50, n),
+                "num_accidents": self.rng.integers(0, 4, n),
+                "customer_description": "A loyal customer with a premium policy.",
+            }
+        )
+
+    def _limit(self, sql, default):
+        match = re.search(r"(?:LIMIT|top_k =>)\s+(\d+)", sql)
+        return min(int(match.group(1)) if match else default, self.num_rows)
+
+    def query(self, sql, *args, **kwargs):
+        with self._lock:
+            self.queries += 1
+
+        if "GROUP BY cp.centroid_id" in sql:
+            df = pd.DataFrame(
+                {
+                    "cluster_id": np.arange(self.num_clusters),
+                    "customer_count": self.rng.integers(10, 500, self.num_clusters),
+                    "avg_age": self.rng.uniform(20, 70, self.num_clusters),
+                    "avg_premium": self.rng.uniform(500, 3000, self.num_clusters),
+                    "avg_years_license": self.rng.uniform(1, 40, self.num_clusters),
+                    "avg_accidents": self.rng.uniform(0, 2, self.num_clusters),
+                }
+            )
+        elif "customer_clusters_predictions" in sql:
+            df = self._customers.head(self._limit(sql, 10)).copy()
+            df.insert(1, "cluster_id", np.arange(len(df)) % self.num_clusters)
+        elif "VECTOR_SEARCH" in sql:
+            df = self._customers.head(self._limit(sql, 5)).copy()
+            df["similarity_score"] = np.linspace(0.1, 0.5, len(df))
+        else:
+            df = self._customers.head(self._limit(sql, 100))
+        return FakeQueryJob(df, self.latency)
+
+
+class FakeGenAIClient:
+    """Stand-in for genai.Client; the API does not call it on any endpoint."""
+
+    def __init__(self, *args, **kwargs):
+        self.models = mock.MagicMock()
+
+
+def load_app(bq_client, genai_client):
+    """Import main.py and inject the given clients through FastAPI's overrides."""
+    import main
+
+    main.app.dependency_overrides[main.get_bq_client] = lambda: bq_client
+    main.app.dependency_overrides[main.get_genai_client] = lambda: genai_client
+    return main.app
+
+
+class ServerThread:
+    """Runs an ASGI app with uvicorn in a background thread."""
+
+    def __init__(self, app, host="127.0.0.1", port=8765):
+        import uvicorn
+
+        self.url = f"http://{host}:{port}"
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host=host, port=port, log_level="warning")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else float("nan")
+
+
+async def run_scenario(base_url, path, rate, concurrency, duration):
+    """
+    Send requests to one endpoint for ``duration`` seconds.
+
+    Requests are scheduled at a fixed ``rate`` per second (open loop), with at
+    most ``concurrency`` in flight; a rate of 0 sends as fast as the
+    concurrency allows (closed loop).
+
+    In open loop, latency is measured from the time a request was scheduled,
+    not from when it could be sent, so waiting for a free slot (the server
+    falling behind the rate) counts as latency instead of being hidden
+    (coordinated omission). Requests sent more than one interval behind
+    schedule are counted as ``late``, and scheduled requests that never got
+    a slot before the end as ``dropped``.
+
+    Returns:
+        dict: Request counts, throughput and latency percentiles in ms
+    """
+    import httpx
+
+    latencies = []
+    errors = 0
+    late = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def one_request(scheduled):
+            nonlocal errors
+            try:
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - scheduled)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            finally:
+                semaphore.release()
+
+        tasks = []
+        started = time.perf_counter()
+        sent = 0
+        while True:
+            now = time.perf_counter()
+            if now - started >= duration:
+                break
+            if rate:
+                scheduled = started + sent / rate
+                if scheduled - started >= duration:
+                    break
+                if scheduled > now:
+                    await asyncio.sleep(scheduled - now)
+            await semaphore.acquire()
+            if not rate:
+                scheduled = time.perf_counter()
+            elif time.perf_counter() - scheduled > 1 / rate:
+                late += 1
+            tasks.append(asyncio.create_task(one_request(scheduled)))
+            sent += 1
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    # Scheduled within the duration but never sent
+    dropped = max(int(duration * rate) - sent, 0) if rate else 0
+    return {
+        "endpoint": path.split("?")[0],
+        "rate": rate,
+        "concurrency": concurrency,
+        "requests": sent,
+        "errors": errors,
+        "late": late,
+        "dropped": dropped,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def run_load_test(base_url, endpoints, rates, concurrencies, duration):
+    results = []
+    for name in endpoints:
+        for rate in rates:
+            for concurrency in concurrencies:
+                result = asyncio.run(
+                    run_scenario(base_url, ENDPOINTS[name], rate, concurrency, duration)
+                )
+                print(
+                    f"{result['endpoint']:<20} rate={rate:<5} conc={concurrency:<4} "
+                    f"req={result['requests']:<6} err={result['errors']:<4} "
+                    f"late={result['late']:<5} drop={result['dropped']:<5} "
+                    f"rps={result['throughput_rps']:8.1f} "
+                    f"p50={result['p50_ms']:7.1f}ms p95={result['p95_ms']:7.1f}ms "
+                    f"p99={result['p99_ms']:7.1f}ms"
+                )
+                results.append(result)
+    return results
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Smart Segmentation API.")
+    parser.add_argument(
+        "--endpoints",
+        default=",".join(ENDPOINTS),
+        help=f"Comma separated endpoints to test, from: {', '.join(ENDPOINTS)}",
+    )
+    parser.add_argument(
+        "--rates", type=_int_list, default=[0], help="Requests per second, 0 for closed loop"
+    )
+    parser.add_argument(
+        "--concurrency", type=_int_list, default=[1, 8, 32], help="Max requests in flight"
+    )
+    parser.add_argument("--duration", type=float, default=5, help="Seconds per scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake BigQuery latency (s)")
+    parser.add_argument("--rows", type=int, default=100, help="Max rows of fake results")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the in-process server")
+    parser.add_argument("--url", help="Test a running server instead of the fake-backed app")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    endpoints = args.endpoints.split(",")
+    if args.url:
+        results = run_load_test(args.url, endpoints, args.rates, args.concurrency, args.duration)
+    else:
+        bq_client = FakeBigQueryClient(latency=args.latency, num_rows=args.rows)
+        app = load_app(bq_client, FakeGenAIClient())
+        with ServerThread(app, port=args.port) as server:
+            results = run_load_test(
+                server.url, endpoints, args.rates, args.concurrency, args.duration
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,107 @@
+import asyncio
 import os
-from fastapi import FastAPI, Query, HTTPException
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Query, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-from google.cloud import bigquery
-from google import genai
+
+_IMPORT_STARTED = time.perf_counter()
+
+# Configuration
+PROJECT_ID = "TO_DO_DEVELOPER"
+GCP_LOCATION = "TO_DO_DEVELOPER"
+DATASET_ID = "TO_DO_DEVELOPER"
+
+# Set up environment variables
+os.environ["GOOGLE_CLOUD_PROJECT"] = PROJECT_ID
+os.environ["GOOGLE_CLOUD_LOCATION"] = GCP_LOCATION
+os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "True"
+
+# Clients are created on first use (or by the background warm-up) and shared
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _shared_client(name, create):
+    with _clients_lock:
+        if name not in _clients:
+            try:
+                _clients[name] = create()
+            except Exception as e:
+                raise HTTPException(
+                    status_code=503, detail=f"Error creating {name} client: {str(e)}"
+                )
+        return _clients[name]
+
+
+def _create_bq_client():
+    from google.cloud import bigquery
+
+    return bigquery.Client()
+
+
+def _create_genai_client():
+    from google import genai
+
+    return genai.Client(project=PROJECT_ID, location="us-central1", vertexai=True)
+
+
+def get_bq_client():
+    """Shared BigQuery client, created on first use."""
+    return _shared_client("BigQuery", _create_bq_client)
+
+
+def get_genai_client():
+    """Shared GenAI client, created on first use."""
+    return _shared_client("GenAI", _create_genai_client)
+
+
+def _warm_up_bigquery(app):
+    # Use the dependency override when there is one (e.g. fake clients in tests)
+    bq_client = app.dependency_overrides.get(get_bq_client, get_bq_client)()
+    bq_client.query("SELECT 1").to_dataframe()
+
+
+async def _warm_up(app):
+    """
+    Creates the BigQuery client and opens a connection in the background.
+
+    Started by the lifespan handler, so it runs while the server binds its
+    socket and serves the first requests; it never delays startup.
+    """
+    report = app.state.startup_report
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(_warm_up_bigquery, app)
+    except Exception as e:
+        # Requests will retry client creation on first use
+        report["warmup_error"] = getattr(e, "detail", str(e))
+    report["warmup_seconds"] = time.perf_counter() - started
+    print(f"Smart Segmentation API startup: {report}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    app.state.startup_report = {
+        "import_seconds": started - _IMPORT_STARTED,
+        "warmup_seconds": None,
+        "warmup_error": None,
+    }
+    warm_up = asyncio.create_task(_warm_up(app))
+    # Lifespan startup is done; the server starts listening right after it
+    app.state.startup_report["startup_seconds"] = time.perf_counter() - _IMPORT_STARTED
+    yield
+    warm_up.cancel()
+
 
 app = FastAPI(
     title="Smart Segmentation API",
     description="API for customer segmentation using embeddings and k-means clustering",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -20,20 +113,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration
-PROJECT_ID = "TO_DO_DEVELOPER"
-GCP_LOCATION = "TO_DO_DEVELOPER"
-DATASET_ID = "TO_DO_DEVELOPER"
-
-# Set up environment variables
-os.environ["GOOGLE_CLOUD_PROJECT"] = PROJECT_ID
-os.environ["GOOGLE_CLOUD_LOCATION"] = GCP_LOCATION
-os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "True"
-
-# Initialize clients
-bq_client = bigquery.Client()
-genai_client = genai.Client(project=PROJECT_ID, location="us-central1", vertexai=True)
-
 
 # Models
 class Customer(BaseModel):
@@ -73,8 +152,19 @@ async def root():
     return {"message": "Welcome to Smart Segmentation API"}
 
 
+@app.get("/health", response_model=dict)
+async def health(request: Request):
+    """
+    Startup timings: module import, import to the end of the app startup (before
+    the server listens), and the background client warm-up started then
+    """
+    return {"status": "ok", "startup": request.app.state.startup_report}
+
+
 @app.get("/customers", response_model=List[Dict[str, Any]])
-async def get_customers(limit: int = Query(100, ge=1, le=1000)):
+async def get_customers(
+    limit: int = Query(100, ge=1, le=1000), bq_client=Depends(get_bq_client)
+):
     """
     Get all customer data from BigQuery with pagination, including policy and analytics data
     """
@@ -108,7 +198,9 @@ async def get_customers(limit: int = Query(100, ge=1, le=1000)):
 
 @app.get("/customers/search", response_model=List[dict])
 async def search_customers(
-    query: str = Query(..., min_length=3), top_k: int = Query(5, ge=1, le=20)
+    query: str = Query(..., min_length=3),
+    top_k: int = Query(5, ge=1, le=20),
+    bq_client=Depends(get_bq_client),
 ):
     """
     Search for customers using natural language via the embedding semantic model
@@ -163,7 +255,9 @@ async def search_customers(
 
 @app.get("/customers/clusters", response_model=List[Dict[str, Any]])
 async def get_customer_clusters(
-    cluster_id: Optional[int] = None, limit: int = Query(10, ge=1, le=100)
+    cluster_id: Optional[int] = None,
+    limit: int = Query(10, ge=1, le=100),
+    bq_client=Depends(get_bq_client),
 ):
     """
     Retrieve customers by cluster with cluster name
@@ -218,7 +312,7 @@ async def get_customer_clusters(
 
 
 @app.get("/clusters/stats", response_model=dict)
-async def get_cluster_stats():
+async def get_cluster_stats(bq_client=Depends(get_bq_client)):
     """
     Get statistics and descriptions for all clusters
     """
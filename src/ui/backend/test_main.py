@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from loadtest import FakeBigQueryClient, FakeGenAIClient
+
+
+@pytest.fixture
+def fake_bq_client():
+    bq_client = FakeBigQueryClient(latency=0, num_clusters=3)
+    main.app.dependency_overrides[main.get_bq_client] = lambda: bq_client
+    main.app.dependency_overrides[main.get_genai_client] = FakeGenAIClient
+    yield bq_client
+    main.app.dependency_overrides.clear()
+
+
+def wait_for_warm_up(client, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        startup = client.get("/health").json()["startup"]
+        if startup["warmup_seconds"] is not None or time.monotonic() > deadline:
+            return startup
+        time.sleep(0.01)
+
+
+def test_import_creates_no_clients():
+    # Importing the app (done above) needs no credentials or cloud project
+    assert main._clients == {}
+
+
+def test_health_reports_startup_and_warm_up(fake_bq_client):
+    with TestClient(main.app) as client:
+        startup = wait_for_warm_up(client)
+
+    assert startup["import_seconds"] <= startup["startup_seconds"]
+    assert startup["warmup_error"] is None
+    assert startup["warmup_seconds"] is not None
+    # The warm-up went through the override, not a real client
+    assert fake_bq_client.queries >= 1
+    assert main._clients == {}
+
+
+def test_endpoint_uses_the_injected_client(fake_bq_client):
+    with TestClient(main.app) as client:
+        response = client.get("/clusters/stats")
+
+    assert response.status_code == 200
+    clusters = response.json()["clusters"]
+    assert len(clusters) == 3
+    assert clusters["0"]["cluster_name"] == main.CLUSTER_NAMES[0]
+
+
+def test_client_creation_failure_is_a_503(monkeypatch):
+    def no_credentials():
+        raise RuntimeError("Your default credentials were not found")
+
+    monkeypatch.setattr(main, "_create_bq_client", no_credentials)
+    monkeypatch.setattr(main, "_clients", {})
+
+    with TestClient(main.app) as client:
+        startup = wait_for_warm_up(client)
+        response = client.get("/customers")
+
+    assert response.status_code == 503
+    assert "credentials were not found" in response.json()["detail"]
+    assert "credentials were not found" in startup["warmup_error"]